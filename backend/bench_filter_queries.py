@@ -0,0 +1,80 @@
+# bench_filter_queries.py
+# Latency of repeated /search/ filter combinations: the old query (every exact
+# .keyword condition as a scoring term in bool.must, the year as a term on
+# Date.keyword) vs the query_builder one (bool.filter terms, year as a range).
+#
+#   ES_URL=http://localhost:9200 python bench_filter_queries.py
+#   python bench_filter_queries.py --sizes 10000,100000 --rounds 50
+#
+# Creates throw-away bench_filters_<n> indices with the documents mapping and
+# deletes them afterwards. Does not touch the documents alias. The shard request
+# cache is bypassed so the numbers show the query (filter) cache only.
+import random
+
+from bench_harness import bench_index, run, time_queries
+from es_mapping import release_year
+from query_builder import SEARCH_QUERY
+
+PUBLISHERS = ["Department of ICT, Government of Grenada", "Ministry of Finance", "Ministry of Health"]
+STATUSES = ["Draft", "Final", "Approved", "Superseded"]
+DOCUMENT_TYPES = ["Toolkit", "Catalog", "Framework", "Procedure", "Guideline"]
+LANGUAGES = ["English", "French", "Spanish"]
+SUBJECT_CATEGORIES = ["Architecture", "Governance", "Security", "Data", "Services"]
+YEARS = [str(year) for year in range(2015, 2026)]
+
+# Filter combinations the repository menu sends over and over
+FILTER_SETS = [
+    {"status": "Draft"},
+    {"publisher": PUBLISHERS[0], "status": "Final"},
+    {"document_type": "Framework", "language": "English"},
+    {"date": "2024"},
+    {"date": "2023", "status": "Approved"},
+    {"subject_category": "Security", "document_type": "Guideline", "date": "2021"},
+]
+
+
+def make_document(rng: random.Random, number: int) -> dict:
+    document = {
+        "filename": f"document {number:06d}.pdf",
+        "Title": f"Document {number}",
+        "Present Status": rng.choice(STATUSES),
+        "Publisher": rng.choice(PUBLISHERS),
+        "Type of Standard Document": rng.choice(DOCUMENT_TYPES),
+        "Language": rng.choice(LANGUAGES),
+        "Subject Category": rng.choice(SUBJECT_CATEGORIES),
+        "Date": rng.choice(YEARS),
+    }
+    document["year"] = release_year(document)
+    return document
+
+
+def old_query(params: dict) -> dict:
+    """The query /search/ built before the filter-context rewrite."""
+    fields = {
+        "status": "Present Status.keyword",
+        "publisher": "Publisher.keyword",
+        "document_type": "Type of Standard Document.keyword",
+        "language": "Language.keyword",
+        "subject_category": "Subject Category.keyword",
+        "date": "Date.keyword",
+    }
+    return {"bool": {"must": [{"term": {fields[param]: value}} for param, value in params.items()]}}
+
+
+def bench(es, size: int, args, rng: random.Random):
+    documents = ({"_source": make_document(rng, number)} for number in range(size))
+
+    with bench_index(es, f"bench_filters_{size}", documents) as index:
+        before = [old_query(params) for params in FILTER_SETS]
+        after = [SEARCH_QUERY.build(params) for params in FILTER_SETS]
+
+        # Warm up both paths (the query cache only admits clauses it has seen a few times)
+        time_queries(es, index, before + after, rounds=5, size=20)
+        return {
+            "before": time_queries(es, index, before, rounds=args.rounds, size=20),
+            "after": time_queries(es, index, after, rounds=args.rounds, size=20),
+        }
+
+
+if __name__ == "__main__":
+    run("Benchmark repeated filter queries", bench, sizes="10000,100000", rounds=50)
@@ -0,0 +1,71 @@
+# bench_harness.py
+# Shared by the bench_*.py scripts: throw-away indices with the documents
+# mapping, query timing and the command line / results table. Each script only
+# brings its corpus and the queries it compares.
+import argparse
+import os
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from elasticsearch import Elasticsearch, helpers
+
+from es_mapping import DOCUMENT_MAPPING, DOCUMENT_SETTINGS
+
+
+def percentile(samples, pct: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct / 100), len(samples) - 1)]
+
+
+def time_queries(es, index: str, queries, rounds: int = 1, size: int = 10) -> list:
+    """Latency in ms of every query, `rounds` times over. The shard request cache is bypassed."""
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            es.search(index=index, query=query, size=size, request_cache=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+@contextmanager
+def bench_index(es, index: str, documents):
+    """
+    A throw-away index with the documents mapping, loaded with `documents`
+    (bulk actions without _index), refreshed and merged to one segment.
+    Deleted on exit. Never touches the documents alias.
+    """
+    es.options(ignore_status=404).indices.delete(index=index)
+    es.indices.create(index=index, mappings=DOCUMENT_MAPPING, settings=DOCUMENT_SETTINGS)
+    try:
+        helpers.bulk(es, ({"_index": index, **action} for action in documents), chunk_size=5000)
+        es.indices.refresh(index=index)
+        es.indices.forcemerge(index=index, max_num_segments=1)
+        yield index
+    finally:
+        es.indices.delete(index=index)
+
+
+def run(description: str, bench_fn, sizes: str, **options):
+    """
+    Command line entry point. bench_fn(es, size, args, rng) returns
+    {query name: latencies} for one corpus size; options are extra integer
+    arguments with their defaults (e.g. queries=200 adds --queries).
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--sizes", default=sizes)
+    parser.add_argument("--seed", type=int, default=42)
+    for name, default in options.items():
+        parser.add_argument(f"--{name}", type=int, default=default)
+    args = parser.parse_args()
+
+    es = Elasticsearch(os.getenv("ES_URL", "http://localhost:9200"), request_timeout=120)
+    rng = random.Random(args.seed)
+
+    print(f"{'docs':>8}  {'query':<9}{'p50 ms':>9}{'p99 ms':>9}{'mean ms':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        for name, latencies in bench_fn(es, size, args, rng).items():
+            print(f"{size:>8}  {name:<9}{percentile(latencies, 50):>9.2f}{percentile(latencies, 99):>9.2f}"
+                  f"{statistics.mean(latencies):>9.2f}")
@@ -0,0 +1,49 @@
+# bench_substring_search.py
+# Latency of filename substring lookups: the old leading wildcard on
+# filename.keyword vs the filename.ngram trigram subfield, at several corpus sizes.
+#
+#   ES_URL=http://localhost:9200 python bench_substring_search.py
+#   python bench_substring_search.py --sizes 1000,10000,100000 --queries 300
+#
+# Creates throw-away bench_substring_<n> indices with the documents mapping and
+# deletes them afterwards. Does not touch the documents alias.
+import random
+
+from bench_harness import bench_index, run, time_queries
+from es_mapping import substring_query
+
+WORDS = [
+    "grenada", "enterprise", "architecture", "framework", "principles", "repository", "roadmap",
+    "toolkit", "maturity", "model", "service", "catalogue", "content", "digital", "egovernment",
+    "overview", "development", "method", "policy", "standard", "guideline", "annex", "draft", "final",
+]
+EXTENSIONS = [".pdf", ".xlsx", ".docx"]
+
+
+def make_filename(rng: random.Random, number: int) -> str:
+    words = " ".join(rng.sample(WORDS, rng.randint(2, 4)))
+    return f"{words} {number:06d}{rng.choice(EXTENSIONS)}"
+
+
+def bench(es, size: int, args, rng: random.Random):
+    filenames = [make_filename(rng, number) for number in range(size)]
+    documents = ({"_id": name, "_source": {"filename": name}} for name in filenames)
+
+    with bench_index(es, f"bench_substring_{size}", documents) as index:
+        needles = []
+        for _ in range(args.queries):
+            name = rng.choice(filenames)
+            length = rng.randint(4, 10)
+            offset = rng.randint(0, max(len(name) - length, 0))
+            needles.append(name[offset:offset + length])
+
+        wildcard = [{"wildcard": {"filename.keyword": f"*{needle}*"}} for needle in needles]
+        ngram = [substring_query("filename", needle) for needle in needles]
+
+        # Warm up both paths before measuring
+        time_queries(es, index, wildcard[:20] + ngram[:20])
+        return {"wildcard": time_queries(es, index, wildcard), "ngram": time_queries(es, index, ngram)}
+
+
+if __name__ == "__main__":
+    run("Benchmark filename substring search", bench, sizes="1000,10000,100000", queries=200)
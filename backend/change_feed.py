@@ -0,0 +1,348 @@
+# change_feed.py
+import fcntl
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+
+from indexer import write_json_atomic
+
+# "notifications" listens to MinIO bucket notifications and falls back to
+# polling if the server does not support them; "poll" only polls; "off" disables.
+CHANGE_FEED_MODE = os.getenv("CHANGE_FEED_MODE", "notifications")
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "30"))
+CHANGE_FEED_POLL_PAGE_SIZE = int(os.getenv("CHANGE_FEED_POLL_PAGE_SIZE", "1000"))
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "1000"))
+CHANGE_FEED_MAX_ATTEMPTS = int(os.getenv("CHANGE_FEED_MAX_ATTEMPTS", "5"))
+CHANGE_FEED_LOCK_FILE = os.getenv("CHANGE_FEED_LOCK_FILE", "/tmp/gogea-change-feed.lock")
+CHANGE_FEED_STATUS_FILE = os.getenv("CHANGE_FEED_STATUS_FILE", "/tmp/gogea-change-feed-status.json")
+MAX_DEAD_LETTERS = 100
+
+NOTIFICATION_EVENTS = ["s3:ObjectCreated:*", "s3:ObjectRemoved:*"]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def parse_notification(event: dict):
+    """Turn a MinIO notification payload into [(action, object_name), ...] with action "put" or "delete"."""
+    changes = []
+    for record in event.get("Records") or []:
+        event_name = record.get("eventName", "")
+        object_name = unquote_plus(record.get("s3", {}).get("object", {}).get("key", ""))
+        if not object_name:
+            continue
+        # Tag changes (PutTagging / DeleteTagging) re-index the object as well
+        if event_name.startswith("s3:ObjectCreated:") or event_name.endswith("Tagging"):
+            changes.append(("put", object_name))
+        elif event_name.startswith("s3:ObjectRemoved:"):
+            changes.append(("delete", object_name))
+    return changes
+
+
+class ChangeFeed:
+    """
+    Keeps the index in sync with the bucket one object at a time.
+
+    A producer thread reads object created/removed events, either from MinIO
+    bucket notifications or from a polling change feed, and puts them on a
+    bounded queue. A consumer thread calls index_fn(object_name) or
+    delete_fn(object_name) for each event, retrying with exponential backoff.
+    Events that still fail after CHANGE_FEED_MAX_ATTEMPTS go to a dead-letter
+    list that is reported in the status and can be requeued. The poller skips
+    an object that was given up on until its fingerprint changes (a corrupt
+    file would otherwise be retried on every pass).
+
+    Only one uvicorn worker on the host runs the feed (file lock); the others
+    wait and take over if it goes away.
+
+    While paused_fn() is true (a full re-index is building a new index that the
+    alias does not point at yet) the consumer holds events back, so they are
+    applied to the new index once the alias has been swapped instead of being
+    written to the old one and lost.
+    """
+
+    def __init__(self, minio_client, bucket: str, index_fn, delete_fn, known_fingerprints_fn=None,
+                 fingerprint_fn=None, paused_fn=None, mode: str = CHANGE_FEED_MODE):
+        self.minio_client = minio_client
+        self.bucket = bucket
+        self.index_fn = index_fn
+        self.delete_fn = delete_fn
+        self.known_fingerprints_fn = known_fingerprints_fn
+        self.fingerprint_fn = fingerprint_fn
+        self.paused_fn = paused_fn
+        self.mode = mode
+
+        self.events = queue.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+        self.dead_letters = deque(maxlen=MAX_DEAD_LETTERS)
+        self._pending = set()  # (action, object_name) queued or being retried
+        self._polled = {}  # object_name -> fingerprint the poller queued it with
+        self._given_up = {}  # object_name -> fingerprint of a dead-lettered put
+        self._stop = threading.Event()
+        self._lock_file = None
+        self._mutex = threading.Lock()
+        self._status = {
+            "mode": mode,
+            "source": None,
+            "active": False,
+            "paused": False,
+            "processed": 0,
+            "retries": 0,
+            "failed": 0,
+            "last_event_at": None,
+            "poll_watermark": None,
+        }
+
+    # ---- Lifecycle ----
+    def start(self):
+        if self.mode == "off":
+            return
+        threading.Thread(target=self._run, name="change-feed", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Wait until this worker owns the feed
+        self._lock_file = open(CHANGE_FEED_LOCK_FILE, "w")
+        while not self._stop.is_set():
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                self._stop.wait(CHANGE_FEED_POLL_SECONDS)
+        if self._stop.is_set():
+            return
+
+        self._update(active=True, pid=os.getpid())
+        threading.Thread(target=self._consume, name="change-feed-consumer", daemon=True).start()
+
+        if self.mode == "notifications":
+            self._listen()
+        if not self._stop.is_set():
+            self._poll()
+
+    # ---- Producers ----
+    def _listen(self):
+        """Consume MinIO bucket notifications, reconnecting with backoff. Returns if they are unsupported."""
+        self._update(source="notifications")
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                with self.minio_client.listen_bucket_notification(self.bucket, events=NOTIFICATION_EVENTS) as events:
+                    backoff = 1
+                    for event in events:
+                        for action, object_name in parse_notification(event):
+                            self.enqueue(action, object_name)
+                        if self._stop.is_set():
+                            return
+            except (ValueError, NotImplementedError) as e:
+                print(f"ℹ️ Bucket notifications unavailable ({e}), falling back to polling.")
+                return
+            except Exception as e:
+                if "NotImplemented" in str(e):
+                    print(f"ℹ️ Bucket notifications unavailable ({e}), falling back to polling.")
+                    return
+                print(f"❌ Notification stream dropped: {e}, reconnecting in {backoff}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _poll(self):
+        """
+        Polling change feed: list the bucket one page at a time with a start_after
+        watermark and compare against the indexed fingerprints. Puts are emitted
+        as pages are read; deletes once a full pass over the bucket completes.
+        """
+        self._update(source="poll")
+        known = {}
+        seen = set()
+        watermark = None
+
+        while not self._stop.is_set():
+            try:
+                if watermark is None:
+                    known = self.known_fingerprints_fn() if self.known_fingerprints_fn else {}
+                    seen = set()
+
+                page = list(itertools.islice(
+                    self.minio_client.list_objects(
+                        self.bucket, recursive=True, start_after=watermark, include_user_meta=True,
+                    ),
+                    CHANGE_FEED_POLL_PAGE_SIZE,
+                ))
+                for obj in page:
+                    seen.add(obj.object_name)
+                    if self.fingerprint_fn is None:
+                        self.enqueue("put", obj.object_name)
+                        continue
+                    fingerprint = self.fingerprint_fn(obj)
+                    if known.get(obj.object_name) == fingerprint:
+                        continue
+                    with self._mutex:
+                        if self._given_up.get(obj.object_name) == fingerprint:
+                            continue  # This version already failed every attempt
+                        self._polled[obj.object_name] = fingerprint
+                    self.enqueue("put", obj.object_name)
+
+                if len(page) == CHANGE_FEED_POLL_PAGE_SIZE:
+                    watermark = page[-1].object_name
+                    self._update(poll_watermark=watermark)
+                    continue  # Read the next page right away
+
+                # Full pass done: whatever was indexed but not seen is gone
+                for object_name in known:
+                    if object_name not in seen:
+                        self.enqueue("delete", object_name)
+                with self._mutex:
+                    self._given_up = {name: fp for name, fp in self._given_up.items() if name in seen}
+                watermark = None
+                self._update(poll_watermark=None, last_poll_at=_now())
+            except Exception as e:
+                print(f"❌ Change feed poll failed: {e}")
+
+            self._stop.wait(CHANGE_FEED_POLL_SECONDS)
+
+    def enqueue(self, action: str, object_name: str, attempt: int = 1, block: bool = True) -> bool:
+        """
+        Queue an event; blocks while the queue is full so producers are throttled.
+        With block=False, returns False instead of waiting when the queue is full.
+        """
+        with self._mutex:
+            if attempt == 1 and (action, object_name) in self._pending:
+                return True  # Already queued, e.g. seen again by the next poll
+            self._pending.add((action, object_name))
+        try:
+            self.events.put((action, object_name, attempt), block=block)
+        except queue.Full:
+            self._done(action, object_name)
+            return False
+        return True
+
+    def _done(self, action: str, object_name: str, given_up: bool = False):
+        with self._mutex:
+            self._pending.discard((action, object_name))
+            fingerprint = self._polled.pop(object_name, None) if action == "put" else None
+            if given_up and fingerprint:
+                self._given_up[object_name] = fingerprint
+            elif action == "put":
+                self._given_up.pop(object_name, None)
+
+    # ---- Consumer ----
+    def _consume(self):
+        while not self._stop.is_set():
+            paused = bool(self.paused_fn and self.paused_fn())
+            if paused != self._status["paused"]:
+                self._update(paused=paused)
+            if paused:
+                self._stop.wait(1)  # Events stay queued (producers block once the queue is full)
+                continue
+
+            try:
+                action, object_name, attempt = self.events.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                if action == "delete":
+                    self.delete_fn(object_name)
+                else:
+                    self.index_fn(object_name)
+                self._done(action, object_name)
+                self._increment(processed=1, last_event_at=_now())
+            except Exception as e:
+                if attempt < CHANGE_FEED_MAX_ATTEMPTS:
+                    self._increment(retries=1)
+                    delay = min(2 ** attempt, 60)
+                    # Retry later without blocking the consumer on this event
+                    threading.Timer(delay, self.enqueue, (action, object_name, attempt + 1)).start()
+                else:
+                    print(f"❌ Giving up on {action} {object_name}: {e}")
+                    self._done(action, object_name, given_up=True)
+                    self.dead_letters.append({
+                        "action": action, "object": object_name, "error": str(e), "attempts": attempt, "at": _now(),
+                    })
+                    self._increment(failed=1)
+            finally:
+                self.events.task_done()
+
+    def retry_dead_letters(self):
+        """
+        Requeue dead-lettered events while the queue has room (never blocks; the
+        rest stay dead-lettered). Returns how many were requeued, or None if this
+        worker does not run the feed: its queue and dead letters are not the live ones.
+        """
+        with self._mutex:
+            if not self._status["active"]:
+                return None
+
+        requeued = 0
+        while self.dead_letters:
+            letter = self.dead_letters[0]
+            if not self.enqueue(letter["action"], letter["object"], block=False):
+                break  # Queue full
+            with self._mutex:
+                self._given_up.pop(letter["object"], None)  # Retried on request, so polls may queue it again
+            self.dead_letters.popleft()
+            requeued += 1
+        self._write()
+        return requeued
+
+    # ---- Status ----
+    def _increment(self, last_event_at=None, **deltas):
+        with self._mutex:
+            for key, delta in deltas.items():
+                self._status[key] += delta
+            if last_event_at:
+                self._status["last_event_at"] = last_event_at
+        self._write()
+
+    def _update(self, **changes):
+        with self._mutex:
+            self._status.update(changes)
+        self._write()
+
+    def _write(self):
+        with self._mutex:
+            payload = {**self._status, "queued": self.events.qsize(), "dead_letters": list(self.dead_letters)}
+        write_json_atomic(CHANGE_FEED_STATUS_FILE, payload)
+
+    def get_status(self) -> dict:
+        """Status of the feed on this host, whichever worker runs it."""
+        try:
+            with open(CHANGE_FEED_STATUS_FILE) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._mutex:
+                return {**self._status, "queued": self.events.qsize(), "dead_letters": list(self.dead_letters)}
+
+
+if __name__ == "__main__":
+    # Manual check against a local MinIO (docker-compose maps the API to localhost:9090):
+    #   MINIO_ENDPOINT=localhost:9090 python change_feed.py
+    # then upload / delete files in the bucket and watch the events arrive.
+    from minio import Minio
+
+    client = Minio(
+        os.getenv("MINIO_ENDPOINT", "localhost:9090"),
+        access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+        secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
+        secure=False,
+    )
+    feed = ChangeFeed(
+        client,
+        os.getenv("MINIO_BUCKET", "mydocuments"),
+        index_fn=lambda name: print(f"index  {name}"),
+        delete_fn=lambda name: print(f"delete {name}"),
+    )
+    feed.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        feed.stop()
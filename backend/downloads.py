@@ -0,0 +1,107 @@
+# downloads.py
+import os
+import re
+from email.utils import format_datetime, parsedate_to_datetime
+
+# Bytes read from MinIO per chunk when streaming an object to the client
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+# Cache-Control sent with downloads and previews. "no-cache" lets browsers and
+# nginx keep a copy but revalidate it, which costs one stat_object and a 304.
+DOWNLOAD_CACHE_CONTROL = os.getenv("DOWNLOAD_CACHE_CONTROL", "no-cache")
+PREVIEW_CACHE_CONTROL = os.getenv("PREVIEW_CACHE_CONTROL", "no-cache")
+# "proxy" streams the bytes through the backend; "redirect" (307) and "json"
+# hand the client a presigned MinIO URL so it fetches them directly.
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "proxy")
+DOWNLOAD_URL_EXPIRY_SECONDS = int(os.getenv("DOWNLOAD_URL_EXPIRY_SECONDS", "300"))
+
+_BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_byte_range(header: str, size: int):
+    """
+    Parse a single-range Range header ("bytes=0-99", "bytes=100-", "bytes=-500")
+    against an object of `size` bytes. Returns (start, end) inclusive, or None
+    when the whole object should be sent (no header, multiple ranges or a
+    syntax we do not understand, which RFC 9110 allows us to ignore).
+    Raises RangeNotSatisfiable if the range lies outside the object.
+    """
+    if not header:
+        return None
+    match = _BYTE_RANGE.fullmatch(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None  # Invalid, ignored
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def entity_tag(stat, variant: str = None) -> str:
+    """Quoted ETag for an object, or for a variant of it (a preview is not the same bytes)."""
+    return f'"{stat.etag}-{variant}"' if variant else f'"{stat.etag}"'
+
+
+def validator_headers(stat, cache_control: str, variant: str = None) -> dict:
+    """ETag, Last-Modified and Cache-Control for a response built from the object `stat`."""
+    return {
+        "ETag": entity_tag(stat, variant),
+        "Last-Modified": format_datetime(stat.last_modified, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match / If-Range list against etag."""
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(header: str, stat) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # HTTP dates have one-second resolution
+    return stat.last_modified.replace(microsecond=0) <= since
+
+
+def is_not_modified(stat, if_none_match: str = None, if_modified_since: str = None, variant: str = None) -> bool:
+    """True if the client's copy is current and a 304 can be sent (If-None-Match wins over If-Modified-Since)."""
+    if if_none_match:
+        return _etag_matches(if_none_match, entity_tag(stat, variant))
+    if if_modified_since:
+        return _not_modified_since(if_modified_since, stat)
+    return False
+
+
+def range_applies(stat, if_range: str = None) -> bool:
+    """If-Range: only honour Range when the client's validator still matches the object."""
+    if not if_range:
+        return True
+    if if_range.strip().startswith(('"', "W/")):
+        return if_range.strip() == entity_tag(stat)
+    return _not_modified_since(if_range, stat)
+
+
+def release_object(response):
+    """Close a MinIO get_object response and hand its connection back to the pool."""
+    response.close()
+    response.release_conn()
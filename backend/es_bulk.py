@@ -0,0 +1,115 @@
+# es_bulk.py
+import json
+import os
+from contextlib import contextmanager
+
+from elasticsearch import helpers
+from elasticsearch.exceptions import NotFoundError
+
+from search_cache import bump_index_generation
+
+BULK_MAX_ACTIONS = int(os.getenv("BULK_MAX_ACTIONS", "500"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+
+
+class BulkWriter:
+    """
+    Buffers index/delete actions for one Elasticsearch index and sends them
+    with the bulk API once BULK_MAX_ACTIONS or BULK_MAX_BYTES is reached.
+
+    A failing item never aborts its batch: it is recorded in `failures`
+    (and passed to on_failure(doc_id, error) if given).
+    """
+
+    def __init__(self, es, index: str, on_failure=None,
+                 max_actions: int = BULK_MAX_ACTIONS, max_bytes: int = BULK_MAX_BYTES):
+        self.es = es
+        self.index_name = index
+        self.on_failure = on_failure
+        self.max_actions = max_actions
+        self.max_bytes = max_bytes
+        self.actions = []
+        self.pending_bytes = 0
+        self.succeeded = 0
+        self.failures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def index(self, doc_id, document: dict):
+        """Queue a document; doc_id=None lets Elasticsearch generate one."""
+        action = {"_op_type": "index", "_index": self.index_name, "_source": document}
+        if doc_id is not None:
+            action["_id"] = doc_id
+        self._add(action, len(json.dumps(document, default=str)))
+
+    def delete(self, doc_id):
+        self._add({"_op_type": "delete", "_index": self.index_name, "_id": doc_id}, 0)
+
+    def _add(self, action: dict, size: int):
+        self.actions.append(action)
+        self.pending_bytes += size
+        if len(self.actions) >= self.max_actions or self.pending_bytes >= self.max_bytes:
+            self.flush()
+
+    def flush(self):
+        """Send the buffered actions and record per-item failures."""
+        if not self.actions:
+            return
+        actions, self.actions, self.pending_bytes = self.actions, [], 0
+
+        succeeded, errors = helpers.bulk(
+            self.es,
+            actions,
+            chunk_size=len(actions),
+            max_chunk_bytes=self.max_bytes * 2,
+            raise_on_error=False,
+            raise_on_exception=False,
+        )
+        self.succeeded += succeeded
+        bump_index_generation()  # Cached search results may now be stale
+
+        for error in errors:
+            op_type, item = next(iter(error.items()))
+            # Deleting a document that is already gone is not a failure
+            if op_type == "delete" and item.get("status") == 404:
+                continue
+            doc_id = item.get("_id")
+            reason = item.get("error") or item.get("exception") or item
+            failure = {"id": doc_id, "error": str(reason)}
+            self.failures.append(failure)
+            if self.on_failure:
+                self.on_failure(doc_id, failure["error"])
+
+    @property
+    def failed_ids(self):
+        return {failure["id"] for failure in self.failures}
+
+
+@contextmanager
+def refresh_disabled(es, index: str):
+    """
+    Turn off periodic refresh on `index` for the duration of a full re-index,
+    then restore the previous refresh_interval and refresh once.
+    """
+    try:
+        settings = es.indices.get_settings(index=index, name="index.refresh_interval")
+    except NotFoundError:
+        yield  # Index will be created by the first bulk request with default settings
+        return
+
+    previous = {
+        name: body.get("settings", {}).get("index", {}).get("refresh_interval")
+        for name, body in settings.items()
+    }
+    es.indices.put_settings(index=index, settings={"index": {"refresh_interval": "-1"}})
+    try:
+        yield
+    finally:
+        for name, interval in previous.items():
+            # None resets the setting to the cluster default
+            es.indices.put_settings(index=name, settings={"index": {"refresh_interval": interval}})
+        es.indices.refresh(index=index)
@@ -0,0 +1,204 @@
+# es_mapping.py
+import os
+import re
+
+from elasticsearch.exceptions import NotFoundError
+
+from search_cache import bump_index_generation
+
+# Searches and incremental writes go through the alias; each full re-index
+# builds a new documents_vN index and swaps the alias to it atomically.
+INDEX_ALIAS = "documents"
+# Physical indices to keep around after a swap, for rollback
+KEEP_OLD_INDICES = int(os.getenv("KEEP_OLD_INDICES", "1"))
+# Bump when DOCUMENT_MAPPING / DOCUMENT_SETTINGS change; an index built with an
+# older version is rebuilt by the next indexing run.
+MAPPING_VERSION = 4
+# Substring queries shorter than this cannot use the trigram subfields
+NGRAM_SIZE = 3
+
+
+def text_with_keyword(ignore_above: int = 256):
+    """Full-text field with a .keyword subfield for exact matches (same shape as the old dynamic mapping)."""
+    return {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": ignore_above}}}
+
+
+def text_with_ngram(ignore_above: int = 256):
+    """text_with_keyword plus a lowercased trigram .ngram subfield for substring search."""
+    field = text_with_keyword(ignore_above)
+    field["fields"]["ngram"] = {"type": "text", "analyzer": "substring_ngram"}
+    return field
+
+
+# Metadata keys produced by extraction.py. Anything else stays in _source but is
+# not indexed ("dynamic": false), so stray keys can no longer bloat the mapping.
+# Adding a searchable key means adding it here and running /index_all/?full=true.
+METADATA_TEXT_FIELDS = [
+    "Title",
+    "Title Alternative",
+    "Document Identifier",
+    "Document Version",
+    "Month",
+    "Date",
+    "Present Status",
+    "Publisher",
+    "Date of Publishing",
+    "Type of Standard Document",
+    "Enforcement Category",
+    "Creator",
+    "Contributor",
+    "Target Audience",
+    "Owner of Approved Standard",
+    "Subject",
+    "Subject Category",
+    "Coverage: Spatial",
+    "Format",
+    "Language",
+    "Copyrights",
+]
+
+# Fields searched by substring (/search/, /combined-search/)
+NGRAM_FIELDS = ["Title", "Title Alternative"]
+
+DOCUMENT_MAPPING = {
+    "dynamic": False,
+    "_meta": {"mapping_version": MAPPING_VERSION},
+    "properties": {
+        **{field: text_with_keyword() for field in METADATA_TEXT_FIELDS},
+        **{field: text_with_ngram() for field in NGRAM_FIELDS},
+        "Brief Description": text_with_keyword(),
+        "filename": text_with_ngram(1024),
+        "status": {"type": "keyword"},
+        "language": {"type": "keyword"},
+        "date": {"type": "date"},
+        # Numeric year of release, derived from "Date" for range filters
+        "year": {"type": "short"},
+        "fingerprint": {"type": "keyword"},
+        # MinIO object tags and stat, so tag lookups never have to list the bucket
+        "tags": {"type": "flattened"},
+        "size": {"type": "long"},
+        "etag": {"type": "keyword"},
+    },
+}
+
+DOCUMENT_SETTINGS = {
+    "number_of_shards": 1,
+    "analysis": {
+        "tokenizer": {
+            # Every character counts (dots, dashes, spaces) so grams are true substrings
+            "trigram": {"type": "ngram", "min_gram": NGRAM_SIZE, "max_gram": NGRAM_SIZE, "token_chars": []},
+        },
+        "analyzer": {
+            "substring_ngram": {"type": "custom", "tokenizer": "trigram", "filter": ["lowercase"]},
+        },
+    },
+}
+
+
+def release_year(document: dict):
+    """Year of release as a number (from the extracted "Date", e.g. "2024"), or None."""
+    match = re.search(r"\b(\d{4})\b", str(document.get("Date", "")))
+    return int(match.group(1)) if match else None
+
+
+def substring_query(field: str, value: str) -> dict:
+    """
+    Case-insensitive "contains" query on a field with an .ngram subfield.
+    A phrase of consecutive trigrams matches exactly the documents containing
+    value, without the term-dictionary scan of a leading wildcard.
+    """
+    if len(value) >= NGRAM_SIZE:
+        return {"match_phrase": {f"{field}.ngram": value}}
+    # Too short to form a trigram: fall back to a (small) wildcard scan
+    return {"wildcard": {f"{field}.keyword": {"value": f"*{value}*", "case_insensitive": True}}}
+
+
+def tag_query(key: str, value: str) -> dict:
+    """Documents whose MinIO object has tag key=value (exact, case-sensitive like the tags themselves)."""
+    return {"term": {f"tags.{key}": value}}
+
+
+def physical_indices(es):
+    """Names of the documents_vN indices, oldest first."""
+    indices = es.indices.get(index=f"{INDEX_ALIAS}_v*", allow_no_indices=True)
+    names = [name for name in indices if re.fullmatch(rf"{INDEX_ALIAS}_v\d+", name)]
+    return sorted(names, key=lambda name: int(name.rsplit("_v", 1)[1]))
+
+
+def alias_targets(es):
+    """Indices the alias currently points to ([] if it does not exist)."""
+    try:
+        return list(es.indices.get_alias(name=INDEX_ALIAS))
+    except NotFoundError:
+        return []
+
+
+def is_legacy_index(es) -> bool:
+    """True if `documents` is still the implicitly created concrete index rather than an alias."""
+    return not alias_targets(es) and bool(es.indices.exists(index=INDEX_ALIAS))
+
+
+def create_versioned_index(es) -> str:
+    """Create the next documents_vN index with the explicit mapping and return its name."""
+    existing = physical_indices(es)
+    next_version = int(existing[-1].rsplit("_v", 1)[1]) + 1 if existing else 1
+    name = f"{INDEX_ALIAS}_v{next_version}"
+
+    es.indices.create(index=name, mappings=DOCUMENT_MAPPING, settings=DOCUMENT_SETTINGS)
+    return name
+
+
+def mapping_version(es, index: str) -> int:
+    mappings = es.indices.get_mapping(index=index)
+    return max(
+        (body["mappings"].get("_meta", {}).get("mapping_version", 0) for body in mappings.values()),
+        default=0,
+    )
+
+
+def ensure_alias(es) -> bool:
+    """
+    Make sure the alias exists. Creates documents_v1 behind it on an empty cluster.
+    Returns False if what is behind `documents` must be rebuilt by a full re-index:
+    a legacy concrete index (swap_alias removes it atomically) or an index built
+    with an older MAPPING_VERSION.
+    """
+    targets = alias_targets(es)
+    if targets:
+        return mapping_version(es, INDEX_ALIAS) >= MAPPING_VERSION
+    if es.indices.exists(index=INDEX_ALIAS):
+        return False
+
+    name = create_versioned_index(es)
+    es.indices.update_aliases(actions=[{"add": {"index": name, "alias": INDEX_ALIAS}}])
+    return True
+
+
+def swap_alias(es, new_index: str):
+    """Point the alias at new_index in one atomic request, then drop indices beyond KEEP_OLD_INDICES."""
+    actions = [{"add": {"index": new_index, "alias": INDEX_ALIAS}}]
+    if is_legacy_index(es):
+        actions.append({"remove_index": {"index": INDEX_ALIAS}})
+    for index in alias_targets(es):
+        if index != new_index:
+            actions.append({"remove": {"index": index, "alias": INDEX_ALIAS}})
+    es.indices.update_aliases(actions=actions)
+    bump_index_generation()
+
+    old_indices = [index for index in physical_indices(es) if index != new_index]
+    for index in old_indices[:max(len(old_indices) - KEEP_OLD_INDICES, 0)]:
+        es.indices.delete(index=index, ignore_unavailable=True)
+
+
+def copy_documents(es, source: str, dest: str, query: dict):
+    """
+    Copy the documents of `source` matching `query` into `dest` (server side).
+    Documents that already exist in `dest` are left alone, never overwritten.
+    """
+    es.reindex(
+        source={"index": source, "query": query},
+        dest={"index": dest, "op_type": "create"},
+        conflicts="proceed",  # Version conflicts are the ids dest already has
+        wait_for_completion=True,
+        refresh=False,
+    )
@@ -0,0 +1,205 @@
+# extraction.py
+# Metadata extraction for the documents stored in MinIO.
+# These functions only work on the bytes they are given (no MinIO / Elasticsearch
+# access), so the indexer can run them in worker processes.
+import io
+import os
+import re
+
+import pdfplumber
+from docx import Document
+from openpyxl import load_workbook
+
+# Bump whenever the extraction functions below change their output, so the
+# incremental indexer re-extracts every object on the next run.
+EXTRACTOR_VERSION = "3"
+
+# PDF metadata tables live in the first pages of our documents. Table detection
+# is limited to the first PDF_TABLE_PAGES pages (0 = all pages) and reading stops
+# once every key in PDF_REQUIRED_KEYS has been found (empty = read every page).
+# Changing these for a corpus needs a full re-index (/index_all/?full=true).
+PDF_TABLE_PAGES = int(os.getenv("PDF_TABLE_PAGES", "3"))
+PDF_REQUIRED_KEYS = [
+    key.strip()
+    for key in os.getenv(
+        "PDF_REQUIRED_KEYS",
+        "Title,Document Version,Present Status,Publisher,Language,Copyrights",
+    ).split(",")
+    if key.strip()
+]
+
+
+def open_buffer(file_data):
+    """
+    Return a seekable binary stream over file_data, which may be the object's
+    bytes or an already-open binary stream. The data is never copied or re-read
+    from storage.
+    """
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        return io.BytesIO(file_data)
+    if file_data.seekable():
+        file_data.seek(0)
+        return file_data
+    return io.BytesIO(file_data.read())
+
+
+def parse_text_metadata(text: str):
+    """Extract metadata from plain text, ensuring no empty keys."""
+    metadata = {}
+    lines = text.split("\n")
+
+    for line in lines:
+        parts = line.split(":", 1)
+        if len(parts) == 2:
+            key, value = parts
+            key, value = key.strip(), value.strip()
+            if key:  # ✅ Ignore empty keys
+                metadata[key] = value
+
+    return metadata
+
+
+def add_pdf_table_metadata(tables, table_metadata: dict):
+    """Add the (S. No., Data Elements, Values) rows of pdfplumber tables to table_metadata."""
+    for table in tables:
+        for row in table:
+            # Ensure row has at least three columns (S. No., Data Elements, Values)
+            if len(row) >= 3:
+                key = row[1].strip() if row[1] else None  # Extract 'Data Elements' column
+                value = row[2].strip() if row[2] else None  # Extract 'Values' column
+
+                if key and value:  # Ensure valid key-value pairs
+                    if key == "Document Version, Month, Year of Release":
+                        # Split the value into parts
+                        match = re.match(r"Version (\S+), (\w+) (\d{4})", value)
+                        if match:
+                            table_metadata["Document Version"] = f"Version {match.group(1)}"
+                            table_metadata["Month"] = match.group(2)
+                            table_metadata["Date"] = match.group(3)
+                        else:
+                            table_metadata[key] = value  # Fallback if the format doesn't match
+                    else:
+                        table_metadata[key] = value
+
+    return table_metadata
+
+
+def extract_pdf_metadata(pdf, table_pages: int = PDF_TABLE_PAGES, required_keys=PDF_REQUIRED_KEYS):
+    """
+    Page-bounded PDF metadata extraction.
+    - Each page's text is extracted once.
+    - Table detection only runs on the first `table_pages` pages (0 = every page).
+    - Stops reading pages as soon as every key in `required_keys` has been found.
+    Table values take precedence over "Key: value" lines in the text, as before.
+    """
+    text_metadata = {}
+    table_metadata = {}
+
+    for page_number, page in enumerate(pdf.pages):
+        text = page.extract_text()
+        if text:
+            text_metadata.update(parse_text_metadata(text))
+
+        if not table_pages or page_number < table_pages:
+            add_pdf_table_metadata(page.extract_tables(), table_metadata)
+
+        page.close()  # Drop the page's parsed objects, long PDFs are read page by page
+
+        if required_keys and all(key in table_metadata or key in text_metadata for key in required_keys):
+            break
+
+    text_metadata.update(table_metadata)
+    return text_metadata
+
+
+def extract_excel_metadata(file_data):
+    """
+    Extracts metadata from an Excel sheet named 'Metadata' and returns it in the required format.
+    The workbook is opened read-only and only the first three columns of the
+    'Metadata' sheet are streamed, so large data sheets are never loaded.
+    """
+    metadata = {}
+    workbook = None
+
+    try:
+        workbook = load_workbook(open_buffer(file_data), read_only=True, data_only=True)
+
+        if "Metadata" not in workbook.sheetnames:
+            print("❌ Sheet 'Metadata' not found! Check the sheet names in the Excel file.")
+            return {}
+
+        rows = workbook["Metadata"].iter_rows(min_col=1, max_col=3, values_only=True)
+        has_values_column = False
+
+        for row_number, row in enumerate(rows):
+            cells = ["" if cell is None else str(cell).strip() for cell in row]
+            serial, key, value = (cells + ["", "", ""])[:3]
+
+            # Skip the first row if it contains headers (like "S. No." / "Data Elements / Values")
+            if row_number == 0 and "S. No." in serial and "Data Elements" in key:
+                continue
+
+            has_values_column = has_values_column or bool(value)
+
+            # Extract key-value pairs from columns 1 and 2 (Data Elements and Values)
+            if key and value:  # Ensure valid key-value pairs
+                if key == "Document Version, Month, Year of Release":
+                    # Split the value into parts
+                    match = re.match(r"Version (\S+), (\w+) (\d{4})", value)
+                    if match:
+                        metadata["Document Version"] = f"Version {match.group(1)}"
+                        metadata["Month"] = match.group(2)
+                        metadata["Date"] = match.group(3)
+                    else:
+                        metadata[key] = value  # Fallback if the format doesn't match
+                else:
+                    metadata[key] = value
+
+        if not has_values_column:  # Ensure the Values column exists
+            print("❌ Sheet is empty or does not have enough columns.")
+            return {}
+
+        print("✅ Extracted metadata:", metadata)
+        return metadata
+
+    except Exception as e:
+        print(f"❌ Error reading Excel file: {e}")
+        return {}
+
+    finally:
+        if workbook is not None:
+            workbook.close()  # Read-only workbooks keep the archive open until closed
+
+
+def extract_metadata_from_file(file_data, filename: str):
+    """
+    Extract metadata from PDF, Excel, and DOCX files and remove empty keys.
+    file_data is the object's bytes or a binary stream; it is the only copy of
+    the object the extractors read.
+    """
+    metadata = {}
+
+    if filename.endswith(".pdf"):
+        with pdfplumber.open(open_buffer(file_data)) as pdf:
+            # Text and structured table metadata, merged
+            metadata = extract_pdf_metadata(pdf)
+
+    elif filename.endswith(".xlsx"):
+        metadata = extract_excel_metadata(file_data)
+
+    elif filename.endswith(".docx"):
+        doc = Document(open_buffer(file_data))
+        text = "\n".join([para.text for para in doc.paragraphs])
+        metadata = parse_text_metadata(text)
+
+    metadata["filename"] = filename
+
+    # ✅ Extract and use meaningful metadata fields
+    metadata["filename"] = filename.lower()
+    metadata["status"] = metadata.get("Present Status", "Unknown").lower()
+    metadata["language"] = metadata.get("Language", "Unknown").lower()
+
+    # ✅ Remove empty keys
+    metadata = {k: v for k, v in metadata.items() if k.strip()}
+
+    return metadata
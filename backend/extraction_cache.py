@@ -0,0 +1,143 @@
+# extraction_cache.py
+import hashlib
+import json
+import os
+import threading
+
+from extraction import EXTRACTOR_VERSION, PDF_REQUIRED_KEYS, PDF_TABLE_PAGES
+
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "/tmp/gogea-extraction-cache")
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# The extraction settings that change results, so entries extracted under other settings are not reused
+EXTRACTION_SETTINGS = hashlib.sha256(f"{PDF_TABLE_PAGES}|{','.join(PDF_REQUIRED_KEYS)}".encode()).hexdigest()[:12]
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extraction results, content-addressed by the SHA-256 of
+    the object bytes plus the file extension, EXTRACTOR_VERSION and the PDF
+    extraction settings (PDF_TABLE_PAGES, PDF_REQUIRED_KEYS).
+
+    Entries are small JSON files; a hit bumps the file's mtime and the oldest
+    entries are evicted once the directory grows past max_bytes (LRU).
+    Safe to share between threads and between uvicorn workers.
+    """
+
+    SUFFIX = ".json"
+
+    def __init__(self, directory: str = EXTRACTION_CACHE_DIR, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None  # Computed lazily from the directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---- Keys ----
+    @staticmethod
+    def key(file_data: bytes, filename: str) -> str:
+        digest = hashlib.sha256(file_data).hexdigest()
+        extension = os.path.splitext(filename)[1].lower().lstrip(".") or "bin"
+        return f"{digest}-{extension}-v{EXTRACTOR_VERSION}-{EXTRACTION_SETTINGS}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}{self.SUFFIX}")
+
+    def _load(self, data: bytes):
+        return json.loads(data)
+
+    def _dump(self, result) -> bytes:
+        return json.dumps(result, default=str).encode()
+
+    # ---- Lookups ----
+    def get(self, key: str):
+        """Return the cached result for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = self._load(f.read())
+            os.utime(path)  # Mark as recently used
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = self._dump(result)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes = self._disk_usage() if self._total_bytes is None else self._total_bytes + len(payload)
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def get_or_extract(self, file_data: bytes, filename: str, extract_fn):
+        """Return extract_fn(file_data, filename), reusing a cached result when the bytes were seen before."""
+        key = self.key(file_data, filename)
+        result = self.get(key)
+        if result is None:
+            result = extract_fn(file_data, filename)
+            self.put(key, result)
+        return result
+
+    # ---- Eviction ----
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(self.SUFFIX):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue  # Evicted by another worker meanwhile
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        return entries
+
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache is back under 90% of max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * 0.9
+
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+            self._total_bytes = total
+
+    # ---- Stats ----
+    def stats(self) -> dict:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._disk_usage()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,47 @@
+# facets.py
+import os
+
+# Buckets returned per facet
+FACET_SIZE = int(os.getenv("FACET_SIZE", "50"))
+
+# Facet name (as shown in the repository filter menu) -> field aggregated.
+# "Date" holds the year of release, so it doubles as the year facet.
+FACET_FIELDS = {
+    name: f"{name}.keyword"
+    for name in [
+        "Title",
+        "Title Alternative",
+        "Document Identifier",
+        "Document Version",
+        "Month",
+        "Date",
+        "Present Status",
+        "Publisher",
+        "Type of Standard Document",
+        "Enforcement Category",
+        "Creator",
+        "Contributor",
+        "Target Audience",
+        "Owner of Approved Standard",
+        "Subject",
+        "Subject Category",
+        "Coverage: Spatial",
+        "Language",
+        "Copyrights",
+    ]
+}
+
+
+def facet_aggregations() -> dict:
+    """One terms aggregation per facet; empty buckets are never returned (min_doc_count 1)."""
+    return {name: {"terms": {"field": field, "size": FACET_SIZE}} for name, field in FACET_FIELDS.items()}
+
+
+def parse_facets(response) -> dict:
+    """{facet name: [{"value", "count"}, ...]} from a search response with facet_aggregations()."""
+    aggregations = response.get("aggregations", {})
+    return {
+        name: [{"value": bucket["key"], "count": bucket["doc_count"]} for bucket in aggregations[name]["buckets"]]
+        for name in FACET_FIELDS
+        if name in aggregations
+    }
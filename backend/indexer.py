@@ -0,0 +1,281 @@
+# indexer.py
+import asyncio
+import fcntl
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+# Shared by every uvicorn worker on the host: the lock makes sure only one of
+# them indexes at a time, the status file lets any worker report progress.
+INDEX_LOCK_FILE = os.getenv("INDEX_LOCK_FILE", "/tmp/gogea-indexer.lock")
+INDEX_STATUS_FILE = os.getenv("INDEX_STATUS_FILE", "/tmp/gogea-indexer-status.json")
+MAX_REPORTED_ERRORS = 100
+
+# Extraction is CPU bound (pdfplumber / pandas) and runs in worker processes;
+# downloads are I/O bound and run on threads. INDEX_EXTRACT_WORKERS=0 extracts
+# inline on the download threads instead.
+INDEX_EXTRACT_WORKERS = int(os.getenv("INDEX_EXTRACT_WORKERS", os.cpu_count() or 1))
+INDEX_DOWNLOAD_WORKERS = int(os.getenv("INDEX_DOWNLOAD_WORKERS", "4"))
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def write_json_atomic(path: str, data: dict):
+    """Write data as JSON so readers in other workers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(data, default=str))
+    os.replace(tmp_path, path)
+
+
+class BackgroundIndexer:
+    """
+    Runs a blocking indexing function in a worker thread and tracks its progress.
+
+    index_fn is called as index_fn(full=..., progress=self) and reports back
+    through set_total() / file_done() / file_skipped() / file_failed()
+    / write_failed().
+
+    stats maps a status key to a callable whose result is included in the
+    status written by the indexing worker (e.g. extraction cache statistics).
+    """
+
+    def __init__(self, index_fn, stats=None):
+        self.index_fn = index_fn
+        self.stats = stats or {}
+        self.task = None
+        self._mutex = threading.Lock()
+        self._status = {"state": "idle"}
+
+    # ---- Control ----
+    def start(self, full: bool = False) -> bool:
+        """Schedule an indexing run on the running event loop. Returns False if one is already running here."""
+        if self.task and not self.task.done():
+            return False
+        self.task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._run, full))
+        return True
+
+    def _run(self, full: bool):
+        with open(INDEX_LOCK_FILE, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print("ℹ️ Another worker is already indexing, skipping this run.")
+                return
+
+            try:
+                self._reset(full)
+                result = self.index_fn(full=full, progress=self)
+                self._update(state="error" if "error" in result else "done", finished_at=_now(), result=result)
+            except Exception as e:
+                self._update(state="error", finished_at=_now(), result={"error": str(e)})
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ---- Progress reporting (called from the indexing thread) ----
+    def set_full(self):
+        """The run turned into a full re-index (e.g. the index had to be rebuilt)."""
+        self._update(mode="full")
+
+    def set_total(self, total: int, bytes_expected: int = None):
+        self._update(files_total=total, bytes_expected=bytes_expected)
+
+    def file_done(self, filename: str):
+        self._increment(files_done=1, current_file=filename)
+
+    def file_skipped(self, filename: str):
+        self._increment(files_skipped=1)
+
+    def file_failed(self, filename: str, error: str):
+        with self._mutex:
+            self._status["errors"] = (self._status["errors"] + [{"file": filename, "error": error}])[-MAX_REPORTED_ERRORS:]
+        self._increment(files_failed=1)
+
+    def write_failed(self, filename: str, error: str):
+        """A file already counted as done was rejected by Elasticsearch."""
+        self._increment(files_done=-1)
+        self.file_failed(filename, error)
+
+    def bytes_fetched(self, size: int):
+        """Count bytes read from storage (called from the download threads)."""
+        self._increment(bytes_fetched=size, objects_fetched=1)
+
+    def _reset(self, full: bool):
+        with self._mutex:
+            self._status = {
+                "state": "running",
+                "mode": "full" if full else "incremental",
+                "pid": os.getpid(),
+                "started_at": _now(),
+                "started_epoch": time.time(),
+                "finished_at": None,
+                "files_total": None,
+                "files_done": 0,
+                "files_skipped": 0,
+                "files_failed": 0,
+                # bytes_fetched > bytes_expected means an object was read more than once
+                "bytes_expected": None,
+                "bytes_fetched": 0,
+                "objects_fetched": 0,
+                "current_file": None,
+                "errors": [],
+                "result": None,
+            }
+        self._write()
+
+    def _increment(self, current_file=None, **deltas):
+        with self._mutex:
+            for key, delta in deltas.items():
+                self._status[key] += delta
+            if current_file:
+                self._status["current_file"] = current_file
+        self._write()
+
+    def _update(self, **changes):
+        with self._mutex:
+            self._status.update(changes)
+        self._write()
+
+    def _write(self):
+        extra = {name: stats_fn() for name, stats_fn in self.stats.items()}
+        with self._mutex:
+            payload = {**self._status, **extra}
+        write_json_atomic(INDEX_STATUS_FILE, payload)
+
+    # ---- Status ----
+    def full_run_in_progress(self) -> bool:
+        """
+        True while a full re-index runs in any worker on this host. Read from the
+        status file only (probing INDEX_LOCK_FILE would make _run skip a run);
+        a "running" status left behind by a worker that died does not count.
+        """
+        try:
+            with open(INDEX_STATUS_FILE) as f:
+                status = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if status.get("state") != "running" or status.get("mode") != "full":
+            return False
+        try:
+            os.kill(status["pid"], 0)
+        except (KeyError, TypeError, ProcessLookupError):
+            return False
+        except PermissionError:
+            pass  # Alive, owned by another user
+        return True
+
+    def get_status(self) -> dict:
+        """Status of the latest run on this host, whichever worker performed it."""
+        try:
+            with open(INDEX_STATUS_FILE) as f:
+                status = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._mutex:
+                status = dict(self._status)
+
+        total = status.get("files_total")
+        processed = status.get("files_done", 0) + status.get("files_skipped", 0) + status.get("files_failed", 0)
+        started = status.pop("started_epoch", None)
+
+        status["progress"] = round(processed / total, 4) if total else None
+        status["eta_seconds"] = None
+        if status.get("state") == "running" and started and total and processed:
+            elapsed = time.time() - started
+            status["elapsed_seconds"] = round(elapsed, 1)
+            status["eta_seconds"] = round(elapsed / processed * (total - processed), 1)
+        return status
+
+
+def extract_in_parallel(objects, download_fn, extract_fn, cache=None):
+    """
+    Download and extract objects concurrently, yielding (obj, metadata, error)
+    in completion order.
+
+    download_fn(obj) runs on a thread pool and extract_fn(data, filename) on a
+    process pool, so extract_fn must be a picklable module-level function.
+    With an ExtractionCache, objects whose bytes were extracted before are
+    answered from the cache without touching the process pool.
+    The number of objects in flight is bounded so large buckets are never
+    held in memory all at once.
+    If an extraction worker dies (e.g. OOM-killed on a huge PDF), the objects
+    it had in flight are reported as failed and a new process pool is started.
+    """
+    objects = iter(objects)
+    max_in_flight = INDEX_DOWNLOAD_WORKERS + 2 * max(INDEX_EXTRACT_WORKERS, 1)
+
+    def fetch(obj):
+        """Download obj and look it up in the cache -> (data, cache key, cached result)."""
+        data = download_fn(obj)
+        if cache is None:
+            return data, None, None
+        key = cache.key(data, obj.object_name)
+        return data, key, cache.get(key)
+
+    def fetch_and_extract(obj):
+        data, key, cached = fetch(obj)
+        if cached is not None:
+            return cached
+        result = extract_fn(data, obj.object_name)
+        if key:
+            cache.put(key, result)
+        return result
+
+    def start_extractors():
+        # "spawn" because the API process is multi-threaded and forking it is unsafe
+        return ProcessPoolExecutor(INDEX_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+    extractors = start_extractors() if INDEX_EXTRACT_WORKERS > 0 else None
+    with ThreadPoolExecutor(INDEX_DOWNLOAD_WORKERS) as downloads:
+        try:
+            in_flight = {}  # future -> (stage, obj, cache key)
+            exhausted = False
+
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    obj = next(objects, None)
+                    if obj is None:
+                        exhausted = True
+                        break
+                    if extractors:
+                        in_flight[downloads.submit(fetch, obj)] = ("download", obj, None)
+                    else:
+                        in_flight[downloads.submit(fetch_and_extract, obj)] = ("extract", obj, None)
+
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, obj, key = in_flight.pop(future)
+                    error = future.exception()
+                    if error:
+                        yield obj, None, error
+                    elif stage == "download":
+                        data, key, cached = future.result()
+                        if cached is not None:
+                            yield obj, cached, None
+                        else:
+                            try:
+                                future = extractors.submit(extract_fn, data, obj.object_name)
+                            except BrokenProcessPool:
+                                # A worker died: everything still queued on the old pool
+                                # fails with BrokenProcessPool, later objects go to a new one
+                                print("⚠️ An extraction worker died, restarting the extraction pool.")
+                                extractors.shutdown(wait=False, cancel_futures=True)
+                                extractors = start_extractors()
+                                future = extractors.submit(extract_fn, data, obj.object_name)
+                            in_flight[future] = ("extract", obj, key)
+                    else:
+                        result = future.result()
+                        if key:
+                            cache.put(key, result)
+                        yield obj, result, None
+        finally:
+            if extractors:
+                extractors.shutdown(cancel_futures=True)
@@ -1,31 +1,58 @@
 import requests
 from fastapi.middleware.cors import CORSMiddleware
 from minio import Minio
-from elasticsearch import Elasticsearch
-import pdfplumber
+from elasticsearch import AsyncElasticsearch, Elasticsearch, helpers
+import asyncio
+import hashlib
 import json
-import io
-from docx import Document
-from datetime import datetime
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, Query, Response
-import pandas as pd
-from typing import List, Dict
+import os
+import re
+from datetime import datetime, timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
+from urllib.parse import unquote_plus
+from fastapi import Body, Depends, FastAPI, Header, Query, Response
+from typing import List, Dict, Literal, Optional
 from minio.error import S3Error
 from fastapi.responses import RedirectResponse
-from fastapi.responses import HTMLResponse
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from bs4 import BeautifulSoup
-import pandas as pd
-import io
-import re
 from elasticsearch.exceptions import NotFoundError
+from elasticsearch.helpers import async_scan
+from indexer import BackgroundIndexer, extract_in_parallel
+from es_bulk import BulkWriter, refresh_disabled
+from downloads import (
+    DOWNLOAD_CACHE_CONTROL, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_MODE, DOWNLOAD_URL_EXPIRY_SECONDS, PREVIEW_CACHE_CONTROL,
+    RangeNotSatisfiable, is_not_modified, parse_byte_range, range_applies, release_object, validator_headers,
+)
+from extraction import EXTRACTOR_VERSION, extract_metadata_from_file
+from extraction_cache import ExtractionCache
+from search_cache import SearchCache, bump_index_generation
+from pagination import InvalidCursor, page_info, page_params
+from facets import facet_aggregations, parse_facets
+from query_builder import (
+    COMBINED_SEARCH_QUERY, FILTER_QUERY, FILTER_QUERY_OLD, SEARCH_QUERY, TITLE_FILTER_QUERY, filter_params,
+    search_params, title_filter_params,
+)
+from previews import PREVIEW_ON_INDEX, PREVIEW_WARM_RENDITIONS, PreviewCache, preview_renderer, preview_variant
+from change_feed import ChangeFeed
+from es_mapping import (
+    INDEX_ALIAS, copy_documents, create_versioned_index, ensure_alias, release_year, swap_alias, tag_query,
+)
 
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan event handler to execute startup tasks."""
-    await index_all_files()  # Automatically index all files in MinIO on startup
+    # Index in the background so search is served from the existing index right away
+    indexer.start()
+    # Then keep the index in sync object by object from bucket notifications
+    change_feed.start()
     yield  # Keep the application running
+    change_feed.stop()
+    await es_async.close()
 
 # Initialize FastAPI with lifespan
 app = FastAPI(lifespan=lifespan)
@@ -202,204 +229,347 @@ minio_client = Minio(
     secure=False
 )
 
+# Presigned download URLs are signed for the host the browser talks to, so
+# they come from a client configured with the public MinIO/nginx endpoint.
+# The region is fixed so presigning never needs a request to that endpoint.
+minio_public_client = Minio(
+    os.getenv("MINIO_PUBLIC_ENDPOINT", "localhost:9090"),
+    access_key="minioadmin",
+    secret_key="minioadmin",
+    secure=os.getenv("MINIO_PUBLIC_SECURE", "false").lower() == "true",
+    region=os.getenv("MINIO_REGION", "us-east-1"),
+)
+
 BUCKET_NAME = "mydocuments"
 
+# "index" answers tag lookups from the tags stored with each document;
+# "minio" reads them from the bucket object by object (before the first re-index).
+TAG_LOOKUP = os.getenv("TAG_LOOKUP", "index")
+# Concurrent get_object_tags calls in that mode; the MinIO client pools 10 connections
+TAG_FETCH_WORKERS = int(os.getenv("TAG_FETCH_WORKERS", "8"))
+
 # Elasticsearch Client
 es = Elasticsearch("http://elasticsearch:9200")
 
-# ✅ Metadata Extraction Functions (Integrated)
-def parse_text_metadata(text: str):
-    """Extract metadata from plain text, ensuring no empty keys."""
-    metadata = {}
-    lines = text.split("\n")
+# Async client for the read endpoints, so a slow query does not hold the event loop.
+# One pooled client is shared by all requests; a search that times out is retried
+# on another connection before the endpoint gives up.
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", "25"))
+ES_SEARCH_TIMEOUT = float(os.getenv("ES_SEARCH_TIMEOUT", "10"))
+ES_SEARCH_RETRIES = int(os.getenv("ES_SEARCH_RETRIES", "2"))
+
+es_async = AsyncElasticsearch(
+    "http://elasticsearch:9200",
+    connections_per_node=ES_CONNECTIONS_PER_NODE,
+    request_timeout=ES_SEARCH_TIMEOUT,
+    max_retries=ES_SEARCH_RETRIES,
+    retry_on_timeout=True,
+)
 
-    for line in lines:
-        parts = line.split(":", 1)
-        if len(parts) == 2:
-            key, value = parts
-            key, value = key.strip(), value.strip()
-            if key:  # ✅ Ignore empty keys
-                metadata[key] = value
 
-    return metadata
+# Repeated searches are answered in-process until the index changes
+search_cache = SearchCache()
 
+# Shared by the indexer and any other path that needs parsed metadata
+extraction_cache = ExtractionCache()
+preview_cache = PreviewCache()
 
-def parse_excel_metadata(df):
-    """Extract metadata from an Excel table, ensuring no empty keys."""
-    metadata = {}
 
-    for index, row in df.iterrows():
-        if len(row) >= 2:
-            key, value = str(row[0]).strip(), str(row[1]).strip()
-            if key:  # ✅ Ignore empty keys
-                metadata[key] = value
+def object_tags(obj):
+    """
+    Tags of an object listed with include_user_meta=True. MinIO returns them
+    inline as a URL-encoded string that minio-py splits without decoding, so
+    they are decoded here to match get_object_tags ("Digital%20Grenada").
+    """
+    return {unquote_plus(key): unquote_plus(value) for key, value in (obj.tags or {}).items()}
 
-    return metadata
 
+def object_fingerprint(obj, tags=None):
+    """
+    Fingerprint of a MinIO object: etag + last_modified + tags + extractor version.
+    Re-tagging does not touch etag or last_modified, hence the tags digest.
+    """
+    tags = object_tags(obj) if tags is None else tags
+    tags_digest = hashlib.sha1(json.dumps(tags, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{obj.etag}|{obj.last_modified.isoformat()}|{tags_digest}|{EXTRACTOR_VERSION}"
 
 
-import re
+def object_fields(obj, tags):
+    """Document fields that come from the MinIO object rather than from its content."""
+    return {
+        "filename": obj.object_name.lower(),
+        "date": obj.last_modified.isoformat(),
+        "fingerprint": object_fingerprint(obj, tags),
+        "tags": tags,
+        "size": obj.size,
+        "etag": obj.etag,
+    }
 
-def extract_pdf_table_metadata(pdf):
-    """Extract metadata from a structured table inside a PDF, ensuring correct key-value mapping."""
-    table_metadata = {}
-
-    for page in pdf.pages:
-        tables = page.extract_tables()
-        for table in tables:
-            for row in table:
-                # Ensure row has at least three columns (S. No., Data Elements, Values)
-                if len(row) >= 3:
-                    key = row[1].strip() if row[1] else None  # Extract 'Data Elements' column
-                    value = row[2].strip() if row[2] else None  # Extract 'Values' column
-
-                    if key and value:  # Ensure valid key-value pairs
-                        if key == "Document Version, Month, Year of Release":
-                            # Split the value into parts
-                            match = re.match(r"Version (\S+), (\w+) (\d{4})", value)
-                            if match:
-                                table_metadata["Document Version"] = f"Version {match.group(1)}"
-                                table_metadata["Month"] = match.group(2)
-                                table_metadata["Date"] = match.group(3)
-                            else:
-                                table_metadata[key] = value  # Fallback if the format doesn't match
-                        else:
-                            table_metadata[key] = value
-
-    return table_metadata
-
-def extract_excel_metadata(file_data: bytes):
-    """Extracts metadata from an Excel sheet named 'Metadata' and returns it in the required format."""
-    metadata = {}
 
+def get_indexed_fingerprints():
+    """Return {document id: fingerprint} for every document written by the indexer."""
+    fingerprints = {}
     try:
-        xls = pd.ExcelFile(io.BytesIO(file_data))
-        print("Available sheets:", xls.sheet_names)  # Debug: Print available sheets
-
-        if "Metadata" not in xls.sheet_names:
-            print("❌ Sheet 'Metadata' not found! Check the sheet names in the Excel file.")
-            return {}
-
-        df = pd.read_excel(xls, sheet_name="Metadata", header=None)
-        print("🔹 DataFrame read successfully:")
-        print(df.head())  # Debug: Print first few rows
-
-        if df.empty or df.shape[1] < 3:  # Ensure at least 3 columns exist
-            print("❌ Sheet is empty or does not have enough columns.")
-            return {}
-
-        # Skip the first row if it contains headers (like "S. No." / "Data Elements / Values")
-        if "S. No." in str(df.iloc[0, 0]) and "Data Elements" in str(df.iloc[0, 1]):
-            df = df.iloc[1:]  # Skip first row
-            print("🔹 Skipped first row (header detected)")
-
-        # Extract key-value pairs from columns 1 and 2 (Data Elements and Values)
-        for _, row in df.iterrows():
-            key = str(row[1]).strip()  # Column 1: Data Elements
-            value = str(row[2]).strip()  # Column 2: Values
-
-            if key and value:  # Ensure valid key-value pairs
-                if key == "Document Version, Month, Year of Release":
-                    # Split the value into parts
-                    match = re.match(r"Version (\S+), (\w+) (\d{4})", value)
-                    if match:
-                        metadata["Document Version"] = f"Version {match.group(1)}"
-                        metadata["Month"] = match.group(2)
-                        metadata["Date"] = match.group(3)
-                    else:
-                        metadata[key] = value  # Fallback if the format doesn't match
-                else:
-                    metadata[key] = value
-
-        print("✅ Extracted metadata:", metadata)
-        return metadata
-
-    except Exception as e:
-        print(f"❌ Error reading Excel file: {e}")
-
-
-def extract_metadata_from_file(file_data: bytes, filename: str):
-    """Extract metadata from PDF, Excel, and DOCX files and remove empty keys."""
-    metadata = {}
-
-    if filename.endswith(".pdf"):
-        with pdfplumber.open(io.BytesIO(file_data)) as pdf:
-            # Extract text-based metadata
-            text = "\n".join([page.extract_text() for page in pdf.pages if page.extract_text()])
-            metadata = parse_text_metadata(text)
-
-            # Extract structured table metadata
-            table_metadata = extract_pdf_table_metadata(pdf)
-
-            # Merge extracted metadata
-            metadata.update(table_metadata)
+        for hit in helpers.scan(
+            es,
+            index="documents",
+            query={"query": {"exists": {"field": "fingerprint"}}},
+            _source=["fingerprint"],
+        ):
+            fingerprints[hit["_id"]] = hit["_source"].get("fingerprint")
+    except NotFoundError:
+        pass  # Index not created yet, everything is new
+    return fingerprints
 
-    elif filename.endswith(".xlsx"):
-        # df = pd.read_excel(io.BytesIO(file_data))
-        # with open(filename, "rb") as f:
-        #      file_data = f.read()
-        file_data = minio_client.get_object(BUCKET_NAME, filename.strip()).read()
-        metadata = extract_excel_metadata(file_data) 
-        #metadata = extract_excel_metadata(df)
 
-    elif filename.endswith(".docx"):
-        doc = Document(io.BytesIO(file_data))
-        text = "\n".join([para.text for para in doc.paragraphs])
-        metadata = parse_text_metadata(text)
+# Ids Elasticsearch generates for documents posted to /index without one
+GENERATED_ID = re.compile(r"[A-Za-z0-9_-]{20}")
 
-    metadata["filename"] = filename
 
-    # ✅ Extract and use meaningful metadata fields
-    metadata["filename"] = filename.lower()
-    metadata["status"] = metadata.get("Present Status", "Unknown").lower()
-    metadata["language"] = metadata.get("Language", "Unknown").lower()
+def get_unfingerprinted_ids():
+    """Ids of documents without a fingerprint: posted to /index, or indexed before fingerprints existed."""
+    try:
+        return [
+            hit["_id"]
+            for hit in helpers.scan(
+                es,
+                index="documents",
+                query={"query": {"bool": {"must_not": {"exists": {"field": "fingerprint"}}}}},
+                _source=False,
+            )
+        ]
+    except NotFoundError:
+        return []
 
-    # ✅ Remove empty keys
-    metadata = {k: v for k, v in metadata.items() if k.strip()}
 
-    return metadata
+def download_object(obj):
+    """Read the full body of a MinIO object, exactly once per indexing pass."""
+    response = minio_client.get_object(BUCKET_NAME, obj.object_name)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
 
 
 # ✅ Indexing Files from MinIO into Elasticsearch
-async def index_all_files():
-    """Index all files from MinIO into Elasticsearch."""
+def index_all_files(full: bool = False, progress=None):
+    """
+    Index files from MinIO into Elasticsearch (blocking, run by the background indexer).
+    - Incremental by default: objects whose fingerprint is unchanged are skipped
+      without being downloaded or re-extracted, and written through the alias.
+    - full=True re-extracts every object into a new documents_vN index and
+      swaps the alias to it once complete, so searches never see a half-built index.
+    - Documents whose objects are gone from the bucket are deleted.
+    - A file that fails to extract is reported and the run carries on.
+    """
+    target = INDEX_ALIAS
     try:
-        objects = minio_client.list_objects(BUCKET_NAME, recursive=True)
+        if not ensure_alias(es):
+            full = True  # Replace a legacy or outdated index
+            if progress:
+                progress.set_full()  # Also holds back the change feed until the alias is swapped
+        if full:
+            target = create_versioned_index(es)
+
+        indexed_fingerprints = get_indexed_fingerprints()
+        # include_user_meta also returns each object's tags, without a request per object
+        objects = list(minio_client.list_objects(BUCKET_NAME, recursive=True, include_user_meta=True))
+
         indexed_files = []
+        unchanged_files = []
+        failed_files = []
+        changed_objects = []
+        seen = set()
 
         for obj in objects:
             filename = obj.object_name
-            response = minio_client.stat_object(BUCKET_NAME, filename)
-            last_modified = response.last_modified.isoformat()
+            seen.add(filename)
+
+            if not full and indexed_fingerprints.get(filename) == object_fingerprint(obj):
+                unchanged_files.append(filename)
+                if progress:
+                    progress.file_skipped(filename)
+                continue
+            changed_objects.append(obj)
+
+        if progress:
+            progress.set_total(len(objects), bytes_expected=sum(obj.size or 0 for obj in changed_objects))
+
+        def download(obj):
+            file_data = download_object(obj)
+            if progress:
+                progress.bytes_fetched(len(file_data))
+            return file_data
+
+        removed_files = [doc_id for doc_id in indexed_fingerprints if doc_id not in seen]
+
+        def on_bulk_failure(doc_id, error):
+            print(f"❌ Elasticsearch rejected {doc_id}: {error}")
+            if progress and doc_id not in removed_files:
+                progress.write_failed(doc_id, error)
+
+        # Periodic refreshes are pointless while the new index is being built
+        refresh_context = refresh_disabled(es, target) if full else nullcontext()
+        with refresh_context, BulkWriter(es, target, on_failure=on_bulk_failure) as writer:
+            # Downloads run on a thread pool and extraction on a process pool;
+            # results come back in completion order.
+            for obj, metadata, error in extract_in_parallel(
+                changed_objects, download, extract_metadata_from_file, cache=extraction_cache
+            ):
+                filename = obj.object_name
+                try:
+                    if error:
+                        raise error
+                    # A cache hit may come from the same bytes stored under another name
+                    metadata.update(object_fields(obj, object_tags(obj)))
+                    metadata["year"] = release_year(metadata)
+
+                    # ✅ Ensure metadata is valid before indexing
+                    if metadata:
+                        writer.index(filename, metadata)
+                        indexed_files.append(filename)
+                    if progress:
+                        progress.file_done(filename)
+                except Exception as e:
+                    print(f"❌ Failed to index {filename}: {e}")
+                    failed_files.append(filename)
+                    if progress:
+                        progress.file_failed(filename, str(e))
+
+            # ✅ Remove documents whose objects no longer exist in MinIO
+            # (a new index simply never receives them)
+            if not full:
+                for doc_id in removed_files:
+                    writer.delete(doc_id)
+
+        rejected = writer.failed_ids
+        failed_files += [f for f in indexed_files if f in rejected]
+        indexed_files = [f for f in indexed_files if f not in rejected]
+
+        if full:
+            # Documents of a legacy index have no fingerprint either; the ones
+            # named after objects that are gone from the bucket are not carried over
+            stale_ids = [
+                doc_id for doc_id in get_unfingerprinted_ids()
+                if doc_id not in seen and not GENERATED_ID.fullmatch(doc_id)
+            ]
+            removed_files += stale_ids
+
+            # Carry over documents posted to /index and the previous version of
+            # files that failed this time, then switch searches to the new index.
+            # Only ids missing from the new index are copied: a legacy index has
+            # no fingerprints, and its documents must not replace the fresh ones.
+            copy_documents(es, INDEX_ALIAS, target, {
+                "bool": {
+                    "should": [
+                        {"bool": {"must_not": [{"exists": {"field": "fingerprint"}}, {"ids": {"values": stale_ids}}]}},
+                        {"ids": {"values": failed_files}},
+                    ]
+                }
+            })
+            es.indices.refresh(index=target)
+            swap_alias(es, target)
+
+        return {
+            "message": f"Indexed {len(indexed_files)} files",
+            "files": indexed_files,
+            "unchanged": len(unchanged_files),
+            "failed": failed_files,
+            "removed": removed_files,
+        }
+    except Exception as e:
+        if target != INDEX_ALIAS:
+            es.options(ignore_status=404).indices.delete(index=target)  # Never swap to a half-built index
+        return {"error": str(e)}
 
-            file_data = minio_client.get_object(BUCKET_NAME, filename).read()
-            metadata = extract_metadata_from_file(file_data, filename)
-            metadata["date"] = last_modified
 
-            # ✅ Ensure metadata is valid before indexing
-            if metadata:
-                es.index(index="documents", id=filename, body=metadata)
-                indexed_files.append(filename)
-                print(metadata)
+indexer = BackgroundIndexer(
+    index_all_files, stats={"extraction_cache": extraction_cache.stats, "preview_cache": preview_cache.stats}
+)
 
-        return {"message": f"Indexed {len(indexed_files)} files", "files": indexed_files}
-    except Exception as e:
-        return {"error": str(e)}
 
+def index_object(object_name: str):
+    """Index a single object (used by the change feed)."""
+    # Listed rather than stat'ed, like in index_all_files: a listing carries the
+    # tags and a millisecond last_modified (stat_object's is whole seconds), so
+    # both paths compute the same fingerprint. The exact name sorts first.
+    listing = minio_client.list_objects(BUCKET_NAME, prefix=object_name, recursive=True, include_user_meta=True)
+    obj = next(iter(listing), None)
+    if obj is None or obj.object_name != object_name:  # Removed before we got to it
+        return delete_object_document(object_name)
+
+    tags = object_tags(obj)
+    file_data = download_object(obj)
+    metadata = extraction_cache.get_or_extract(file_data, object_name, extract_metadata_from_file)
+    metadata.update(object_fields(obj, tags))
+    metadata["year"] = release_year(metadata)
+
+    if PREVIEW_ON_INDEX and preview_renderer(object_name):
+        # Have the thumbnail ready before anyone opens the repository page
+        try:
+            for size, fmt in PREVIEW_WARM_RENDITIONS:
+                preview_cache.get_or_render(obj.etag, object_name, lambda: file_data, size=size, fmt=fmt)
+        except Exception as e:
+            print(f"❌ Failed to render preview of {object_name}: {e}")
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifespan event to index files at startup."""
-    await index_all_files()  # ✅ Index files when FastAPI starts
-    yield
+    with BulkWriter(es, "documents") as writer:
+        writer.index(object_name, metadata)
+    if writer.failures:
+        raise RuntimeError(writer.failures[0]["error"])
 
 
+def delete_object_document(object_name: str):
+    """Remove the document of an object that was deleted from MinIO."""
+    es.options(ignore_status=404).delete(index="documents", id=object_name)
+    bump_index_generation()
+
+
+change_feed = ChangeFeed(
+    minio_client,
+    BUCKET_NAME,
+    index_fn=index_object,
+    delete_fn=delete_object_document,
+    known_fingerprints_fn=get_indexed_fingerprints,
+    fingerprint_fn=object_fingerprint,
+    paused_fn=indexer.full_run_in_progress,
+)
 
 
 @app.get("/index_all/")
-async def trigger_index_all():
-    """Manually trigger indexing of all files"""
-    return await index_all_files()
+async def trigger_index_all(full: bool = Query(False, description="Re-extract every file, ignoring fingerprints")):
+    """Start a background indexing run of all files and return its status."""
+    started = indexer.start(full=full)
+    return {"started": started, "status": indexer.get_status()}
+
+
+@app.get("/index_status/")
+async def index_status():
+    """Progress of the current (or last) indexing run: files done, errors, ETA, cache hits."""
+    return indexer.get_status()
+
+
+@app.get("/search_cache_status/")
+async def search_cache_status():
+    """Hit ratio and time saved by this worker's search result cache."""
+    return search_cache.stats()
+
+
+@app.get("/change_feed_status/")
+async def change_feed_status():
+    """State of the event-driven indexer: source, events processed, retries, dead letters."""
+    return change_feed.get_status()
+
+
+@app.post("/change_feed_retry/")
+async def change_feed_retry():
+    """Requeue the dead-lettered change feed events (as many as the queue has room for)."""
+    requeued = change_feed.retry_dead_letters()
+    if requeued is None:
+        # Another uvicorn worker runs the feed and holds its dead letters
+        return {"error": "The change feed runs in another worker, retry the request",
+                "feed_pid": change_feed.get_status().get("pid")}
+    return {"requeued": requeued, "dead_letters": len(change_feed.dead_letters)}
 
 
 @app.post("/index")
@@ -411,81 +581,23 @@ async def index_document(document: dict):
 
     if not document:
         return {"error": "Document contains only empty keys"}
+    if "year" not in document:
+        document["year"] = release_year(document)
 
-    es.index(index="documents", body=document)
+    with BulkWriter(es, "documents") as writer:
+        writer.index(None, document)
+
+    if writer.failures:
+        return {"error": writer.failures[0]["error"]}
     return {"message": "Document indexed"}
 
 
 @app.get("/filter-documents-old/")
-async def filter_documents(
-    status: str = Query(None),
-    publisher: str = Query(None),
-    year_of_publish: str = Query(None),
-    document_type: str = Query(None),
-    enforcement: str = Query(None),
-    creator: str = Query(None),
-    contributor: str = Query(None),
-    target_audience: str = Query(None),
-    format: str = Query(None),
-    language: str = Query(None),
-    coverage: str = Query(None),
-    identifier: str = Query(None),
-    month: str = Query(None),
-    document_version: str = Query(None),
-    title: str = Query(None),
-    title_alternative: str = Query(None),
-    owner: str = Query(None),
-    subject: str = Query(None),
-    subject_category: str = Query(None),
-    filename: str = Query(None),
-    copyrights: str = Query(None),
-    brief_description: str = Query(None),
-
-
-
-):
+async def filter_documents(params: dict = Depends(filter_params)):
     """Filter documents based on metadata fields."""
-    es_query = {"bool": {"must": [], "filter": []}}
-
-    filters = {
-    "Present Status": status,
-    "Publisher": publisher,
-    "Document Version, Month, Year of Release ": year_of_publish,
-    "month": month,  # New filter
-    "document version": document_version,  # New filter
-    "Type of Standard Document": document_type,
-    "Enforcement Category": enforcement,
-    "Creator": creator,
-    "Contributor": contributor,
-    "Target Audience": target_audience,
-    "Format": format,
-    "Language": language,
-    "Coverage: Spatial": coverage,
-    "Document Identifier": identifier,
-    "Title": title,  # New filter
-    "Title Alternative": title_alternative,  # New filter
-    "Owner of Approved Standard ": owner,  # New filter
-    "Subject": subject,  # New filter
-    "Subject Category": subject_category,  # New filter
-    "filename": filename,  # New filter
-    "Copyrights": copyrights,  # New filter
-    "Brief Description": brief_description,
-
-}
-
-   
-
-    for key, value in filters.items():
-        if value:
-            es_query["bool"]["must"].append({"match_phrase": {key: value}}) 
-
-        
-
-
-
-    print("Elasticsearch Query:", json.dumps(es_query, indent=4))  # Debugging
+    es_query = FILTER_QUERY_OLD.build(params) or {"bool": {}}
 
-    response = es.search(index="documents", body={"query": es_query})
+    response = await es_async.search(index="documents", body={"query": es_query})
 
     documents = [
         hit["_source"].get("filename", "Unknown") for hit in response["hits"]["hits"]
@@ -496,126 +608,34 @@ async def filter_documents(
 
 @app.get("/filter-documents/")
 async def filter_documents(
-    status: str = Query(None),
-    publisher: str = Query(None),
-    year_of_publish: str = Query(None),
-    document_type: str = Query(None),
-    enforcement: str = Query(None),
-    creator: str = Query(None),
-    contributor: str = Query(None),
-    target_audience: str = Query(None),
-    format: str = Query(None),
-    language: str = Query(None),
-    coverage: str = Query(None),
-    identifier: str = Query(None),
-    month: str = Query(None),
-    document_version: str = Query(None),
-    title: str = Query(None),
-    title_alternative: str = Query(None),
-    owner: str = Query(None),
-    subject: str = Query(None),
-    subject_category: str = Query(None),
-    filename: str = Query(None),
-    copyrights: str = Query(None),
-    brief_description: str = Query(None),
-    date: str = Query(None),
+    params: dict = Depends(filter_params),
+    page_size: Optional[int] = Query(None, ge=1, description="Hits per page (capped server-side)"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
 ):
-    """Filter documents based on metadata fields."""
-    es_query = {"bool": {"must": []}}
-
-    filters = {
-    "Present Status": status,
-    "Publisher": publisher,
-    "Document Version, Month, Year of Release ": year_of_publish,
-    "month": month,  # New filter
-    "document version": document_version,  # New filter
-    "Type of Standard Document": document_type,
-    "Enforcement Category": enforcement,
-    "Creator": creator,
-    "Contributor": contributor,
-    "Target Audience": target_audience,
-    "Format": format,
-    "Language": language,
-    "Coverage: Spatial": coverage,
-    "Document Identifier": identifier,
-    "Title": title,  # New filter
-    "Title Alternative": title_alternative,  # New filter
-    "Owner of Approved Standard ": owner,  # New filter
-    "Subject": subject,  # New filter
-    "Subject Category": subject_category,  # New filter
-    "Filename": filename,  # New filter
-    "Copyrights": copyrights,  # New filter
-    "Brief Description": brief_description,
-    "Date":date
-
-}
+    """Filter documents based on metadata fields, one page at a time."""
+    es_query = FILTER_QUERY.build(params)
 
-    for key, value in filters.items():
-        if value:  # ✅ Ensure value is not None
-            es_query["bool"]["must"].append({"match_phrase": {key: value}})
-            
-
-    print("Filters being applied:", filters)
-    print("Elasticsearch Query:", json.dumps(es_query, indent=4))  # Debugging
-    print("Search Value:", list(es_query["bool"]["must"][0]["match_phrase"].values())[0])
-    search_value =  list(es_query["bool"]["must"][0]["match_phrase"].values())[0]
     # ✅ Check if query contains at least one filter
-    if not es_query["bool"]["must"]:
-        print("not found query triggered")
+    if not es_query:
         return {"message": "No filters provided!"}
 
     try:
-        response = es.search(index="documents", body={"query": es_query})
+        page = page_params(page_size, cursor)
+        response = await search_cache.search_async(es_async, index="documents", body={"query": es_query, **page})
         documents = [hit["_source"].get("filename", "Unknown") for hit in response["hits"]["hits"]]
 
-        if not documents:  # ✅ Redirect if no documents found
-            print("No documents found, redirecting...")
-            #return RedirectResponse(url="/filter-document-title/")
-
-        return {"message": "Filter function works!", "documents": documents}
-        #return search_value
+        return {"message": "Filter function works!", "documents": documents, **page_info(response, page["size"])}
 
     except Exception as e:
         return {"error": str(e)}
 
 
-
-
-
-
 @app.get("/filter-document-title/")
-async def filter_documents(
-    title: str = Query(None),
-    title_alternative: str = Query(None),
-    owner: str = Query(None),
-    subject: str = Query(None),
-    subject_category: str = Query(None),
-    filename: str = Query(None),
-    copyrights: str = Query(None),
-    brief_description: str = Query(None),
-):
+async def filter_documents(params: dict = Depends(title_filter_params)):
     """Filter documents based on metadata fields."""
-    es_query = {"bool": {"must": []}}
-
-    filters = {
-        "Title": title,  # Ensure case matches Elasticsearch stored field
-        "Title Alternative": title_alternative,
-        "Owner of Approved Standard": owner,  # New filter
-        "Subject": subject,  # New filter
-        "Subject Category": subject_category,  # New filter
-        "filename": filename,  # New filter
-        "Copyrights": copyrights,  # New filter
-        "Brief Description": brief_description,
-
-    }
+    es_query = TITLE_FILTER_QUERY.build(params) or {"bool": {}}
 
-    for key, value in filters.items():
-        if value:
-            es_query["bool"]["must"].append({"match_phrase": {key: value}})  # Use match_phrase for exact phrase match
-
-    print("Elasticsearch Query:", json.dumps(es_query, indent=4))  # Debugging
-
-    response = es.search(index="documents", body={"query": es_query})
+    response = await search_cache.search_async(es_async, index="documents", body={"query": es_query})
 
     documents = [
         hit["_source"].get("filename", "Unknown") for hit in response["hits"]["hits"]
@@ -625,30 +645,78 @@ async def filter_documents(
 
 
 
-@app.get("/search-documents/")
-async def search_documents(tag_key: str, tag_value: str):
+def iter_bucket_tags():
     """
-    Search for PDF documents in MinIO based on tag values.
+    Yield (object, tags) for every object in the bucket, in listing order (TAG_LOOKUP=minio).
+    Tags are fetched on TAG_FETCH_WORKERS threads with at most twice that many
+    requests in flight; objects whose tags cannot be read are skipped.
     """
-    matching_files = []
+    def fetch(obj):
+        try:
+            return obj, minio_client.get_object_tags(BUCKET_NAME, obj.object_name)
+        except S3Error as e:
+            print(f"Error fetching tags for {obj.object_name}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=TAG_FETCH_WORKERS) as pool:
+        in_flight = deque()
+        for obj in minio_client.list_objects(BUCKET_NAME, recursive=True):
+            in_flight.append(pool.submit(fetch, obj))
+            if len(in_flight) >= TAG_FETCH_WORKERS * 2:
+                result = in_flight.popleft().result()
+                if result:
+                    yield result
+        while in_flight:
+            result = in_flight.popleft().result()
+            if result:
+                yield result
+
+
+def tagged_file(obj, tags):
+    """A MinIO object in the shape the tag search endpoints return."""
+    return {
+        "file_name": obj.object_name,
+        "size": obj.size,
+        "last_modified": obj.last_modified.strftime("%Y-%m-%d %H:%M:%S"),
+        "etag": obj.etag,
+        "tags": tags
+    }
 
-    # List all objects in the bucket
-    objects = minio_client.list_objects(BUCKET_NAME, recursive=True)
 
-    for obj in objects:
-        try:
-            # Get tags for each object
-            tags = minio_client.get_object_tags(BUCKET_NAME, obj.object_name)
-            if tags and tags.get(tag_key) == tag_value:
-                matching_files.append({
-                    "file_name": obj.object_name,
-                    "size": obj.size,
-                    "last_modified": obj.last_modified.strftime("%Y-%m-%d %H:%M:%S"),
-                    "etag": obj.etag,
-                    "tags": tags
-                })
-        except:
-            continue  # Skip objects without tags
+def tagged_file_from_hit(hit):
+    """Same shape as tagged_file, built from the object fields stored with the document."""
+    source = hit["_source"]
+    return {
+        "file_name": hit["_id"],
+        "size": source.get("size"),
+        "last_modified": datetime.fromisoformat(source["date"]).strftime("%Y-%m-%d %H:%M:%S"),
+        "etag": source.get("etag"),
+        "tags": source.get("tags") or {}
+    }
+
+
+TAGGED_FILE_SOURCE = ["size", "date", "etag", "tags"]
+
+
+@app.get("/search-documents/")
+async def search_documents(tag_key: str, tag_value: str):
+    """
+    Search for documents by MinIO tag value.
+    """
+    if TAG_LOOKUP == "minio":
+        matching_files = [
+            tagged_file(obj, tags) for obj, tags in await asyncio.to_thread(lambda: list(iter_bucket_tags()))
+            if tags and tags.get(tag_key) == tag_value
+        ]
+    else:
+        hits = [
+            hit async for hit in async_scan(
+                es_async, index=INDEX_ALIAS, query={"query": tag_query(tag_key, tag_value)},
+                _source=TAGGED_FILE_SOURCE,
+            )
+        ]
+        # Bucket listing order, as before
+        matching_files = [tagged_file_from_hit(hit) for hit in sorted(hits, key=lambda hit: hit["_id"])]
 
     if not matching_files:
         return {"message": "No documents found with the given tag."}
@@ -674,42 +742,86 @@ async def list_files_with_tags():
     """
     files_with_tags = {}
 
-    try:
-        # Get list of all files
-        objects = minio_client.list_objects(BUCKET_NAME, recursive=True)
-
-        for obj in objects:
-            try:
-                # Fetch object tags
-                tags = minio_client.get_object_tags(BUCKET_NAME, obj.object_name)
-                
+    if TAG_LOOKUP == "minio":
+        try:
+            for obj, tags in await asyncio.to_thread(lambda: list(iter_bucket_tags())):
                 # Store filename with its tags
                 files_with_tags[obj.object_name] = tags if tags else {}
+        except S3Error as e:
+            return {"error": str(e)}
+        return files_with_tags
 
-            except S3Error as e:
-                print(f"Error fetching tags for {obj.object_name}: {str(e)}")
+    # Every object the indexer has seen carries its tags
+    async for hit in async_scan(
+        es_async, index=INDEX_ALIAS, query={"query": {"exists": {"field": "fingerprint"}}}, _source=["tags"],
+    ):
+        files_with_tags[hit["_id"]] = hit["_source"].get("tags") or {}
 
-    except S3Error as e:
-        return {"error": str(e)}
-
-    return files_with_tags
+    return dict(sorted(files_with_tags.items()))
 
 
 @app.get("/download-file/{file_name}")
-async def download_file(file_name: str):
+def download_file(
+    file_name: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
     """
-    Download a file from MinIO and return it as a response.
+    Stream a file from MinIO to the client without buffering it.
+    Honours a single byte Range (206 Partial Content) so PDF viewers can seek,
+    and answers conditional requests with 304 after a stat_object only.
+    With DOWNLOAD_MODE=redirect or json the client gets a short-lived presigned
+    MinIO URL instead and the bytes never pass through the backend.
     """
     try:
-        # Get the file from MinIO
-        file_obj = minio_client.get_object(BUCKET_NAME, file_name)
-        
-        # Read the file data
-        file_data = file_obj.read()
+        stat = minio_client.stat_object(BUCKET_NAME, file_name)
+
+        if DOWNLOAD_MODE in ("redirect", "json"):
+            url = minio_public_client.presigned_get_object(
+                BUCKET_NAME,
+                file_name,
+                expires=timedelta(seconds=DOWNLOAD_URL_EXPIRY_SECONDS),
+                response_headers={"response-content-disposition": f'attachment; filename="{file_name}"'},
+            )
+            if DOWNLOAD_MODE == "json":
+                return {"url": url, "expires_in": DOWNLOAD_URL_EXPIRY_SECONDS}
+            return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+
+        headers = {
+            "Content-Disposition": f'attachment; filename="{file_name}"',
+            "Accept-Ranges": "bytes",
+            **validator_headers(stat, DOWNLOAD_CACHE_CONTROL),
+        }
+        if is_not_modified(stat, if_none_match, if_modified_since):
+            return Response(status_code=304, headers=headers)
 
-        # Return the file as a response
-        return Response(content=file_data, media_type="application/octet-stream",
-                        headers={"Content-Disposition": f'attachment; filename="{file_name}"'})
+        try:
+            byte_range = parse_byte_range(range_header, stat.size) if range_applies(stat, if_range) else None
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{stat.size}"})
+
+        if byte_range:
+            start, end = byte_range
+            file_obj = minio_client.get_object(BUCKET_NAME, file_name, offset=start, length=end - start + 1)
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.size}"
+        else:
+            start, end = 0, stat.size - 1
+            file_obj = minio_client.get_object(BUCKET_NAME, file_name)
+            status_code = 200
+        headers["Content-Length"] = str(end - start + 1)
+
+        # Chunks are piped as MinIO returns them; the connection goes back to the
+        # pool once the response is finished or the client has gone away.
+        return StreamingResponse(
+            file_obj.stream(DOWNLOAD_CHUNK_SIZE),
+            status_code=status_code,
+            media_type="application/octet-stream",
+            headers=headers,
+            background=BackgroundTask(release_object, file_obj),
+        )
 
     except S3Error as e:
         return {"error": str(e)}
@@ -723,79 +835,41 @@ INDEX_NAME = "documents"
 
 @app.get("/search/")
 async def search_documents(
-    title: Optional[str] = None,
-    title_alternative: Optional[str] = None,
-    document_identifier: Optional[str] = None,
-    document_version: Optional[str] = None,
-    month: Optional[str] = None,
-    date: Optional[str] = None,
-    status: Optional[str] = None,
-    publisher: Optional[str] = None,
-    document_type: Optional[str] = None,
-    enforcement: Optional[str] = None,
-    creator: Optional[str] = None,
-    contributor: Optional[str] = None,
-    brief_description: Optional[str] = None,
-    target_audience: Optional[str] = None,
-    owner: Optional[str] = None,
-    subject: Optional[str] = None,
-    subject_category: Optional[str] = None,
-    coverage: Optional[str] = None,
-    format: Optional[str] = None,
-    language: Optional[str] = None,
-    copyrights: Optional[str] = None,
-    filename: Optional[str] = None
+    params: dict = Depends(search_params),
+    page_size: Optional[int] = Query(None, ge=1, description="Hits per page (capped server-side)"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
 ):
-    query = {"bool": {"must": []}}
-
-    filters = {
-        "Title.keyword": title,
-        "Title Alternative.keyword": title_alternative,
-        "Document Identifier.keyword": document_identifier,
-        "Document Version.keyword": document_version,
-        "Month.keyword": month,
-        "Date.keyword": date,
-        "Present Status.keyword": status,
-        "Publisher.keyword": publisher,
-        "Type of Standard Document.keyword": document_type,
-        "Enforcement Category.keyword": enforcement,
-        "Creator.keyword": creator,
-        "Contributor.keyword": contributor,
-        "Brief Description.keyword": brief_description,
-        "Target Audience.keyword": target_audience,
-        "Owner of Approved Standard.keyword": owner,
-        "Subject.keyword": subject,
-        "Subject Category.keyword": subject_category,
-        "Coverage: Spatial.keyword": coverage,
-        "Language.keyword": language,
-        "Copyrights.keyword": copyrights,
-    }
+    # Exact .keyword matches in filter context, partial matches (filename,
+    # format, title_alternative) scored in must
+    query = SEARCH_QUERY.build(params) or {"bool": {}}
 
-    # Exact match filters
-    for field, value in filters.items():
-        if value:
-            query["bool"]["must"].append({"term": {field: value}})
+    # Cursor pagination: pass next_cursor back to get the following page
+    try:
+        page = page_params(page_size, cursor)
+    except InvalidCursor:
+        return {"error": "Invalid cursor"}
+    response = await search_cache.search_async(es_async, index=INDEX_NAME, query=query, **page)
 
-    # Partial match for `filename` and `format`
-    # if filename:
-    #     query["bool"]["must"].append({"match_phrase": {"filename": filename}})
-    must_conditions = []
-    if filename:
-        query["bool"]["must"].append({"wildcard": {"filename.keyword": f"*{filename}*"}})
+    filenames = [hit["_source"]["filename"] for hit in response["hits"]["hits"]]
 
-    if format:
-        query["bool"]["must"].append({"match_phrase": {"Format": format}})
-    
-    if title_alternative:
-        query["bool"]["must"].append({"wildcard": {"Title Alternative.keyword": f"*{title_alternative}*"}})
+    return {"filenames": filenames, **page_info(response, page["size"])}
 
-       
-    response = es.search(index=INDEX_NAME, query=query, size=100)
 
-    filenames = [hit["_source"]["filename"] for hit in response["hits"]["hits"]]
+@app.get("/facets/")
+async def get_facets(params: dict = Depends(search_params)):
+    """
+    Values and document counts of every filter in the repository menu, for the
+    documents matching the given filters (same parameters as /search/).
+    One search with size=0 and a terms aggregation per facet.
+    """
+    # Counts only, so every condition goes in (non-scoring, cacheable) filter context
+    query = SEARCH_QUERY.build(params, scoring=False) or {"bool": {}}
 
-    return {"filenames": filenames}
+    response = await search_cache.search_async(
+        es_async, index=INDEX_NAME, query=query, size=0, aggs=facet_aggregations(), track_total_hits=True
+    )
 
+    return {"total": response["hits"]["total"]["value"], "facets": parse_facets(response)}
 
 
 @app.get("/files/descriptions")
@@ -809,7 +883,7 @@ async def get_file_description(filename: str = Query(..., description="Enter the
         }
     }
 
-    response = es.search(index=INDEX_NAME, query=query, size=1)
+    response = await es_async.search(index=INDEX_NAME, query=query, size=1)
 
     if response["hits"]["hits"]:
         file_metadata = response["hits"]["hits"][0]["_source"]
@@ -819,42 +893,72 @@ async def get_file_description(filename: str = Query(..., description="Enter the
     return {"error": "File not found"}
 
 
+# Fields returned per file by /files/metadata, with their fallbacks
+FILE_METADATA_FIELDS = {
+    "Brief Description": "No description available",
+    "Document Version": "Not available",
+    "Present Status": "Not available",
+    "Publisher": "Not available",
+    "Date of Publishing": "Not available",
+}
+FILE_METADATA_MAX_BATCH = int(os.getenv("FILE_METADATA_MAX_BATCH", "500"))
+
+
+@app.post("/files/metadata")
+async def get_files_metadata(
+    filenames: List[str] = Body(..., embed=True, description="Object names, as returned by /list-files")
+):
+    """
+    Description and metadata of many files in one request: what /files/descriptions
+    and /file-metadata/ return, for a whole repository page.
+    Documents are fetched by id (the object name) with a single mget; names not
+    found by id (e.g. the lower-cased filenames search endpoints return) are then
+    looked up by their filename field in one search.
+    """
+    if len(filenames) > FILE_METADATA_MAX_BATCH:
+        return {"error": f"At most {FILE_METADATA_MAX_BATCH} filenames per request."}
+    if not filenames:
+        return {"documents": {}, "missing": []}
+
+    response = await es_async.mget(
+        index=INDEX_ALIAS, ids=list(dict.fromkeys(filenames)), source_includes=list(FILE_METADATA_FIELDS)
+    )
+
+    def file_metadata(source):
+        return {field: source.get(field, default) for field, default in FILE_METADATA_FIELDS.items()}
+
+    documents = {}
+    missing = []
+    for doc in response["docs"]:
+        if doc.get("found"):
+            documents[doc["_id"]] = file_metadata(doc["_source"])
+        else:
+            missing.append(doc["_id"])
+
+    if missing:
+        by_filename = {}
+        for name in missing:
+            by_filename.setdefault(name.lower(), []).append(name)
+        response = await es_async.search(
+            index=INDEX_ALIAS,
+            query={"terms": {"filename.keyword": list(by_filename)}},
+            source_includes=list(FILE_METADATA_FIELDS) + ["filename"],
+            size=len(by_filename),
+        )
+        for hit in response["hits"]["hits"]:
+            for name in by_filename.pop(hit["_source"].get("filename"), []):
+                documents[name] = file_metadata(hit["_source"])
+        missing = [name for names in by_filename.values() for name in names]
+
+    return {"documents": documents, "missing": missing}
+
+
 @app.get("/combined-search/")
 def combined_search(title: str = Query(..., description="Search query for title or tag")):
     # --- Elasticsearch query ---
-    es_query = {
-        "query": {
-            "bool": {
-                "should": [
-                    {"match_phrase": {"Title": title}},
-                    {"term": {"Title Alternative.keyword": title}},
-                    {"term": {"Document Identifier.keyword": title}},
-                    {"match_phrase": {"Document Version": title}},
-                    {"match_phrase": {"Month": title}},
-                    {"match_phrase": {"Date": title}},
-                    {"match_phrase": {"Publisher": title}},
-                    {"match_phrase": {"Type of Standard Document": title}},
-                    {"match_phrase": {"Enforcement Category": title}},
-                    {"match_phrase": {"Creator": title}},
-                    {"match_phrase": {"Contributor": title}},
-                    {"match_phrase": {"Brief Description": title}},
-                    {"match_phrase": {"Target Audience": title}},
-                    {"match_phrase": {"Owner of Approved Standard": title}},
-                    {"match_phrase": {"Subject": title}},
-                    {"match_phrase": {"Subject Category": title}},
-                    {"match_phrase": {"Coverage: Spatial": title}},
-                    {"match_phrase": {"Format": title}},
-                    {"match_phrase": {"Language": title}},
-                    {"match_phrase": {"Copyrights": title}},
-                    {"wildcard": {"filename.keyword": f"*{title}*"}},
-                    {"match": {"filename": title}}
-                ],
-                "minimum_should_match": 1
-            }
-        }
-    }
+    es_query = {"query": COMBINED_SEARCH_QUERY.build(title)}
 
-    es_response = es.search(index="documents", body=es_query)
+    es_response = search_cache.search(es, index="documents", body=es_query)
     elastic_files = [
         hit["_source"]["filename"]
         for hit in es_response["hits"]["hits"]
@@ -862,22 +966,17 @@ def combined_search(title: str = Query(..., description="Search query for title
     ]
 
     # --- MinIO tag-based search ---
-    minio_matches = []
-    objects = minio_client.list_objects(BUCKET_NAME, recursive=True)
-    for obj in objects:
-        try:
-            tags = minio_client.get_object_tags(BUCKET_NAME, obj.object_name)
-            # Here we use title as both key and value
-            if tags and tags.get(title) == title:
-                minio_matches.append({
-                    "file_name": obj.object_name,
-                    "size": obj.size,
-                    "last_modified": obj.last_modified.strftime("%Y-%m-%d %H:%M:%S"),
-                    "etag": obj.etag,
-                    "tags": tags
-                })
-        except:
-            continue
+    # Here we use title as both key and value
+    if TAG_LOOKUP == "minio":
+        minio_matches = [
+            tagged_file(obj, tags) for obj, tags in iter_bucket_tags()
+            if tags and tags.get(title) == title
+        ]
+    else:
+        hits = helpers.scan(
+            es, index=INDEX_ALIAS, query={"query": tag_query(title, title)}, _source=TAGGED_FILE_SOURCE,
+        )
+        minio_matches = [tagged_file_from_hit(hit) for hit in sorted(hits, key=lambda hit: hit["_id"])]
 
     return {
         "elasticsearch_results": elastic_files,
@@ -886,61 +985,40 @@ def combined_search(title: str = Query(..., description="Search query for title
 
 
 @app.get("/preview-file/{file_name}")
-def preview_file(file_name: str):
+def preview_file(
+    file_name: str,
+    size: Literal["thumb", "card", "full"] = Query("full", description="PDF preview width: thumb, card or full page"),
+    format: Literal["png", "webp", "jpeg"] = Query("png", description="PDF preview image format"),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
     """
     Returns a preview of the file from MinIO.
-    - For PDF files: returns the first page as a PNG image.
+    - For PDF files: returns the first page as an image of the requested size and format.
     - For Excel (.xlsx) files: returns an HTML table preview from the sheet named "Title"
       (if exists, otherwise the first sheet).
+    Each rendition is rendered once per object version and then served from the
+    preview cache; one the client already has is answered with 304.
     """
-    if file_name.lower().endswith(".pdf"):
-        try:
-            # Fetch PDF data from MinIO
-            file_obj = minio_client.get_object(BUCKET_NAME, file_name)
-            file_data = file_obj.read()
-
-            # Open PDF and convert the first page to an image using pdfplumber
-            with pdfplumber.open(io.BytesIO(file_data)) as pdf:
-                if len(pdf.pages) == 0:
-                    return {"error": "No pages found in PDF."}
-                first_page = pdf.pages[0]
-                pdf_image = first_page.to_image(resolution=150)
-
-                # Save the image to a BytesIO buffer
-                img_buffer = io.BytesIO()
-                pdf_image.save(img_buffer, format="PNG")
-                img_buffer.seek(0)
-
-            # Return the image as a PNG response
-            return Response(content=img_buffer.getvalue(), media_type="image/png")
-
-        except Exception as e:
-            return {"error": str(e)}
-
-    elif file_name.lower().endswith(".xlsx"):
-        try:
-            # Fetch Excel file from MinIO
-            file_obj = minio_client.get_object(BUCKET_NAME, file_name)
-            file_data = file_obj.read()
-
-            # Load Excel file
-            xls = pd.ExcelFile(io.BytesIO(file_data))
-            # Use the sheet named "Title" if it exists, otherwise fall back to the first sheet.
-            sheet_name = "Title" if "Title" in xls.sheet_names else xls.sheet_names[0]
-            df = pd.read_excel(xls, sheet_name=sheet_name)
-            # Take a preview (first 5 rows)
-            preview_df = df.head(5)
-            # Convert the DataFrame to an HTML table
-            html_content = preview_df.to_html(index=False, border=1)
-
-            # Return the HTML content
-            return HTMLResponse(content=html_content)
+    if not preview_renderer(file_name):
+        return {"error": "Preview is only supported for PDF and Excel (.xlsx) files."}
 
-        except Exception as e:
-            return {"error": str(e)}
+    try:
+        stat = minio_client.stat_object(BUCKET_NAME, file_name)
+        variant = f"preview-{preview_variant(file_name, size, format)}"
+        headers = validator_headers(stat, PREVIEW_CACHE_CONTROL, variant=variant)
+        if is_not_modified(stat, if_none_match, if_modified_since, variant=variant):
+            return Response(status_code=304, headers=headers)
+
+        preview, media_type = preview_cache.get_or_render(
+            stat.etag, file_name, lambda: download_object(stat), size=size, fmt=format
+        )
+        if preview is None:
+            return {"error": "No pages found in PDF."}
+        return Response(content=preview, media_type=media_type, headers=headers)
 
-    else:
-        return {"error": "Preview is only supported for PDF and Excel (.xlsx) files."}
+    except Exception as e:
+        return {"error": str(e)}
     
 
 
@@ -964,7 +1042,7 @@ async def get_file_metadata(
                 }
             }
         }
-        response = es.search(index="documents", body=query)
+        response = await es_async.search(index="documents", body=query)
 
         hits = response["hits"]["hits"]
         if not hits:
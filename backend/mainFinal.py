@@ -12,13 +12,14 @@ from fastapi import FastAPI, Query, Response
 import pandas as pd
 from typing import List, Dict
 from minio.error import S3Error
+from indexer import BackgroundIndexer
 
 
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan event handler to execute startup tasks."""
-    await index_all_files()  # Automatically index all files in MinIO on startup
+    indexer.start()  # Index all files in MinIO in the background on startup
     yield  # Keep the application running
 
 # Initialize FastAPI with lifespan
@@ -188,12 +189,8 @@ def extract_metadata_from_file(file_data: bytes, filename: str):
             metadata.update(table_metadata)
 
     elif filename.endswith(".xlsx"):
-        # df = pd.read_excel(io.BytesIO(file_data))
-        # with open(filename, "rb") as f:
-        #      file_data = f.read()
-        file_data = minio_client.get_object(BUCKET_NAME, filename.strip()).read()
-        metadata = extract_excel_metadata(file_data) 
-        #metadata = extract_excel_metadata(df)
+        # ✅ Use the bytes already downloaded by the indexer, never re-fetch from MinIO
+        metadata = extract_excel_metadata(file_data)
 
     elif filename.endswith(".docx"):
         doc = Document(io.BytesIO(file_data))
@@ -214,10 +211,12 @@ def extract_metadata_from_file(file_data: bytes, filename: str):
 
 
 # ✅ Indexing Files from MinIO into Elasticsearch
-async def index_all_files():
-    """Index all files from MinIO into Elasticsearch."""
+def index_all_files(progress=None):
+    """Index all files from MinIO into Elasticsearch (blocking, run by the background indexer)."""
     try:
-        objects = minio_client.list_objects(BUCKET_NAME, recursive=True)
+        objects = list(minio_client.list_objects(BUCKET_NAME, recursive=True))
+        if progress:
+            progress.set_total(len(objects))
         indexed_files = []
 
         for obj in objects:
@@ -233,25 +232,30 @@ async def index_all_files():
             if metadata:
                 es.index(index="documents", id=filename, body=metadata)
                 indexed_files.append(filename)
+            if progress:
+                progress.file_done(filename)
 
         return {"message": f"Indexed {len(indexed_files)} files", "files": indexed_files}
     except Exception as e:
         return {"error": str(e)}
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifespan event to index files at startup."""
-    await index_all_files()  # ✅ Index files when FastAPI starts
-    yield
+indexer = BackgroundIndexer(lambda full, progress: index_all_files(progress))
 
 
 
 
 @app.get("/index_all/")
 async def trigger_index_all():
-    """Manually trigger indexing of all files"""
-    return await index_all_files()
+    """Start a background indexing run of all files and return its status."""
+    started = indexer.start()
+    return {"started": started, "status": indexer.get_status()}
+
+
+@app.get("/index_status/")
+async def index_status():
+    """Progress of the current (or last) indexing run: files done, errors, ETA."""
+    return indexer.get_status()
 
 
 @app.post("/index")
@@ -0,0 +1,60 @@
+# pagination.py
+import base64
+import json
+import os
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "100"))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "500"))
+# Totals are exact up to this many hits, reported as a lower bound ("gte") above it
+SEARCH_TRACK_TOTAL_HITS = int(os.getenv("SEARCH_TRACK_TOTAL_HITS", "10000"))
+
+# Stable order for search_after: relevance, then the filename as a tiebreaker.
+# (_id would be the natural tiebreaker, but Elasticsearch 8 refuses to sort on it.)
+PAGE_SORT = [
+    {"_score": {"order": "desc"}},
+    {"filename.keyword": {"order": "asc", "missing": "_last"}},
+]
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(sort_values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """search_after values of a cursor: one scalar per PAGE_SORT entry, anything else is InvalidCursor."""
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(sort_values, list) or len(sort_values) != len(PAGE_SORT):
+        raise InvalidCursor(f"expected {len(PAGE_SORT)} sort values")
+    if not all(value is None or isinstance(value, (str, int, float)) for value in sort_values):
+        raise InvalidCursor("sort values must be scalars")
+    return sort_values
+
+
+def page_params(page_size: int = None, cursor: str = None) -> dict:
+    """size / sort / search_after / track_total_hits for one page, page_size capped at SEARCH_MAX_PAGE_SIZE."""
+    params = {
+        "size": min(page_size or SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE),
+        "sort": PAGE_SORT,
+        "track_total_hits": SEARCH_TRACK_TOTAL_HITS,
+    }
+    if cursor:
+        params["search_after"] = decode_cursor(cursor)
+    return params
+
+
+def page_info(response, size: int) -> dict:
+    """total, total_relation and the cursor of the next page (None on the last page)."""
+    hits = response["hits"]["hits"]
+    total = response["hits"]["total"]
+    return {
+        "total": total["value"],
+        "total_relation": total["relation"],
+        "next_cursor": encode_cursor(hits[-1]["sort"]) if len(hits) == size else None,
+    }
@@ -0,0 +1,119 @@
+# previews.py
+import io
+import os
+
+import pandas as pd
+import pdfplumber
+
+from extraction_cache import ExtractionCache
+
+PREVIEW_CACHE_DIR = os.getenv("PREVIEW_CACHE_DIR", "/tmp/gogea-preview-cache")
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv("PREVIEW_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Render previews of new and changed objects as the change feed indexes them
+PREVIEW_ON_INDEX = os.getenv("PREVIEW_ON_INDEX", "true").lower() == "true"
+# Renditions rendered at index time, as size:format pairs
+PREVIEW_WARM_RENDITIONS = [
+    tuple(rendition.split(":")) for rendition in os.getenv("PREVIEW_WARM_RENDITIONS", "card:webp,full:png").split(",")
+]
+# Bump when rendering changes so cached previews are regenerated
+PREVIEW_VERSION = "2"
+PDF_PREVIEW_RESOLUTION = 150
+EXCEL_PREVIEW_ROWS = 5
+
+# PDF renditions: target width in pixels, None for the full 150 dpi page
+PREVIEW_SIZES = {"thumb": 200, "card": 480, "full": None}
+# format -> (PIL format, media type, save options)
+PREVIEW_FORMATS = {
+    "png": ("PNG", "image/png", {}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True}),
+}
+
+
+def render_pdf_preview(file_data: bytes, size: str = "full", fmt: str = "png"):
+    """First page of a PDF as an image of the given size and format, or None if it has no pages."""
+    pil_format, _, options = PREVIEW_FORMATS[fmt]
+    width = PREVIEW_SIZES[size]
+
+    with pdfplumber.open(io.BytesIO(file_data)) as pdf:
+        if len(pdf.pages) == 0:
+            return None
+        # Rasterise straight at the target width rather than downscaling a full render
+        if width:
+            pdf_image = pdf.pages[0].to_image(width=width)
+        else:
+            pdf_image = pdf.pages[0].to_image(resolution=PDF_PREVIEW_RESOLUTION)
+
+        # Save the image to a BytesIO buffer
+        img_buffer = io.BytesIO()
+        if pil_format == "PNG":
+            pdf_image.save(img_buffer, format="PNG")  # Quantised to 256 colours, as before
+        else:
+            pdf_image.original.convert("RGB").save(img_buffer, format=pil_format, **options)
+    return img_buffer.getvalue()
+
+
+def render_excel_preview(file_data: bytes, size: str = "full", fmt: str = "png"):
+    """First rows of the "Title" sheet (or the first sheet) as an HTML table (size and format do not apply)."""
+    xls = pd.ExcelFile(io.BytesIO(file_data))
+    sheet_name = "Title" if "Title" in xls.sheet_names else xls.sheet_names[0]
+    df = pd.read_excel(xls, sheet_name=sheet_name)
+    return df.head(EXCEL_PREVIEW_ROWS).to_html(index=False, border=1).encode()
+
+
+# extension -> (renderer, whether it produces image renditions)
+PREVIEW_RENDERERS = {
+    ".pdf": (render_pdf_preview, True),
+    ".xlsx": (render_excel_preview, False),
+}
+
+
+def preview_renderer(filename: str):
+    """(renderer, produces images) for a file, or None if it cannot be previewed."""
+    return PREVIEW_RENDERERS.get(os.path.splitext(filename)[1].lower())
+
+
+def preview_variant(filename: str, size: str = "full", fmt: str = "png") -> str:
+    """Name of a rendition, used in its cache key and ETag. HTML previews have a single one."""
+    _, is_image = preview_renderer(filename)
+    return f"{size}-{fmt}" if is_image else "html"
+
+
+class PreviewCache(ExtractionCache):
+    """
+    Rendered previews on disk, keyed by the MinIO object etag, so each version
+    of a file is rendered once. Same LRU eviction and sharing as ExtractionCache.
+    """
+
+    SUFFIX = ".preview"
+
+    def __init__(self, directory: str = PREVIEW_CACHE_DIR, max_bytes: int = PREVIEW_CACHE_MAX_BYTES):
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def key(etag: str, filename: str, variant: str) -> str:
+        extension = os.path.splitext(filename)[1].lower().lstrip(".")
+        return f"{etag}-{extension}-{variant}-v{PREVIEW_VERSION}"
+
+    def _load(self, data: bytes):
+        return data
+
+    def _dump(self, result) -> bytes:
+        return result
+
+    def get_or_render(self, etag: str, filename: str, load_fn, size: str = "full", fmt: str = "png"):
+        """
+        Return (preview bytes, media type) for one rendition of the object version `etag`.
+        Each size/format is cached separately. load_fn() is only called, to fetch
+        the object bytes, on a cache miss. The preview is None if the file has
+        nothing to show (e.g. an empty PDF).
+        """
+        render, is_image = preview_renderer(filename)
+        media_type = PREVIEW_FORMATS[fmt][1] if is_image else "text/html"
+        key = self.key(etag, filename, preview_variant(filename, size, fmt))
+        preview = self.get(key)
+        if preview is None:
+            preview = render(load_fn(), size, fmt)
+            if preview is not None:
+                self.put(key, preview)
+        return preview, media_type
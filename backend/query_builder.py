@@ -0,0 +1,259 @@
+# query_builder.py
+import datetime
+import re
+from typing import Optional
+
+from fastapi import Query
+
+from es_mapping import substring_query
+
+
+def year_clause(field: str, value: str) -> dict:
+    """A four-digit year is a range filter on the numeric year field; anything else an exact term."""
+    value = value.strip()
+    if re.fullmatch(r"\d{4}", value):
+        return {"range": {"year": {"gte": int(value), "lte": int(value)}}}
+    return {"term": {f"{field}.keyword": value}}
+
+
+# Clause templates: kind -> clause(field, value)
+CLAUSES = {
+    "term": lambda field, value: {"term": {field: value}},
+    "gte": lambda field, value: {"range": {field: {"gte": value}}},
+    "lte": lambda field, value: {"range": {field: {"lte": value}}},
+    "year": year_clause,
+    "phrase": lambda field, value: {"match_phrase": {field: value}},
+    "match": lambda field, value: {"match": {field: value}},
+    "substring": substring_query,
+}
+
+
+class QueryBuilder:
+    """
+    Turns request parameters into an Elasticsearch bool query.
+
+    Built once per endpoint from {param: [(occur, kind, field), ...]}; the
+    templates are resolved up front so building a query is one dict lookup
+    and one small dict per non-empty parameter. Exact .keyword terms go in
+    "filter" (non-scoring, cached by Elasticsearch), text conditions in "must".
+    """
+
+    def __init__(self, fields: dict):
+        self.fields = {
+            param: [(occur, CLAUSES[kind], field) for occur, kind, field in clauses]
+            for param, clauses in fields.items()
+        }
+
+    def build(self, params: dict, scoring: bool = True):
+        """
+        bool query for the non-empty params, or None if there are none.
+        scoring=False puts every clause in filter context (counts, aggregations).
+        """
+        bool_query = {}
+        for param, value in params.items():
+            if not value:
+                continue
+            for occur, clause, field in self.fields.get(param, ()):
+                bool_query.setdefault(occur if scoring else "filter", []).append(clause(field, value))
+        return {"bool": bool_query} if bool_query else None
+
+
+class AnyFieldQuery:
+    """One value matched against many fields: a bool.should of precomputed templates."""
+
+    def __init__(self, clauses: list):
+        self.clauses = [(CLAUSES[kind], field) for kind, field in clauses]
+
+    def build(self, value: str) -> dict:
+        return {
+            "bool": {
+                "should": [clause(field, value) for clause, field in self.clauses],
+                "minimum_should_match": 1,
+            }
+        }
+
+
+def _exact(field: str):
+    return [("filter", "term", f"{field}.keyword")]
+
+
+def _phrase(field: str):
+    return [("must", "phrase", field)]
+
+
+# /search/ and /facets/
+SEARCH_QUERY = QueryBuilder({
+    "title": _exact("Title"),
+    "title_alternative": _exact("Title Alternative") + [("must", "substring", "Title Alternative")],
+    "document_identifier": _exact("Document Identifier"),
+    "document_version": _exact("Document Version"),
+    "month": _exact("Month"),
+    "date": [("filter", "year", "Date")],
+    "year_from": [("filter", "gte", "year")],
+    "year_to": [("filter", "lte", "year")],
+    "modified_after": [("filter", "gte", "date")],
+    "modified_before": [("filter", "lte", "date")],
+    "status": _exact("Present Status"),
+    "publisher": _exact("Publisher"),
+    "document_type": _exact("Type of Standard Document"),
+    "enforcement": _exact("Enforcement Category"),
+    "creator": _exact("Creator"),
+    "contributor": _exact("Contributor"),
+    "brief_description": _exact("Brief Description"),
+    "target_audience": _exact("Target Audience"),
+    "owner": _exact("Owner of Approved Standard"),
+    "subject": _exact("Subject"),
+    "subject_category": _exact("Subject Category"),
+    "coverage": _exact("Coverage: Spatial"),
+    "language": _exact("Language"),
+    "copyrights": _exact("Copyrights"),
+    "filename": [("must", "substring", "filename")],
+    "format": _phrase("Format"),
+})
+
+# /filter-documents/ (phrase matches, field names as the frontend has always sent them)
+FILTER_QUERY_FIELDS = {
+    "status": _phrase("Present Status"),
+    "publisher": _phrase("Publisher"),
+    "year_of_publish": _phrase("Document Version, Month, Year of Release "),
+    "month": _phrase("month"),
+    "document_version": _phrase("document version"),
+    "document_type": _phrase("Type of Standard Document"),
+    "enforcement": _phrase("Enforcement Category"),
+    "creator": _phrase("Creator"),
+    "contributor": _phrase("Contributor"),
+    "target_audience": _phrase("Target Audience"),
+    "format": _phrase("Format"),
+    "language": _phrase("Language"),
+    "coverage": _phrase("Coverage: Spatial"),
+    "identifier": _phrase("Document Identifier"),
+    "title": _phrase("Title"),
+    "title_alternative": _phrase("Title Alternative"),
+    "owner": _phrase("Owner of Approved Standard "),
+    "subject": _phrase("Subject"),
+    "subject_category": _phrase("Subject Category"),
+    "filename": _phrase("Filename"),
+    "copyrights": _phrase("Copyrights"),
+    "brief_description": _phrase("Brief Description"),
+    "date": _phrase("Date"),
+}
+FILTER_QUERY = QueryBuilder(FILTER_QUERY_FIELDS)
+
+# /filter-documents-old/: no date, and filename on the lower-case field
+FILTER_QUERY_OLD = QueryBuilder({
+    **{param: clauses for param, clauses in FILTER_QUERY_FIELDS.items() if param != "date"},
+    "filename": _phrase("filename"),
+})
+
+# /filter-document-title/
+TITLE_FILTER_QUERY = QueryBuilder({
+    "title": _phrase("Title"),
+    "title_alternative": _phrase("Title Alternative"),
+    "owner": _phrase("Owner of Approved Standard"),
+    "subject": _phrase("Subject"),
+    "subject_category": _phrase("Subject Category"),
+    "filename": _phrase("filename"),
+    "copyrights": _phrase("Copyrights"),
+    "brief_description": _phrase("Brief Description"),
+})
+
+# /combined-search/
+COMBINED_SEARCH_QUERY = AnyFieldQuery([
+    ("phrase", "Title"),
+    ("term", "Title Alternative.keyword"),
+    ("term", "Document Identifier.keyword"),
+    ("phrase", "Document Version"),
+    ("phrase", "Month"),
+    ("phrase", "Date"),
+    ("phrase", "Publisher"),
+    ("phrase", "Type of Standard Document"),
+    ("phrase", "Enforcement Category"),
+    ("phrase", "Creator"),
+    ("phrase", "Contributor"),
+    ("phrase", "Brief Description"),
+    ("phrase", "Target Audience"),
+    ("phrase", "Owner of Approved Standard"),
+    ("phrase", "Subject"),
+    ("phrase", "Subject Category"),
+    ("phrase", "Coverage: Spatial"),
+    ("phrase", "Format"),
+    ("phrase", "Language"),
+    ("phrase", "Copyrights"),
+    ("substring", "filename"),
+    ("match", "filename"),
+])
+
+
+def search_params(
+    title: Optional[str] = None,
+    title_alternative: Optional[str] = None,
+    document_identifier: Optional[str] = None,
+    document_version: Optional[str] = None,
+    month: Optional[str] = None,
+    date: Optional[str] = None,
+    status: Optional[str] = None,
+    publisher: Optional[str] = None,
+    document_type: Optional[str] = None,
+    enforcement: Optional[str] = None,
+    creator: Optional[str] = None,
+    contributor: Optional[str] = None,
+    brief_description: Optional[str] = None,
+    target_audience: Optional[str] = None,
+    owner: Optional[str] = None,
+    subject: Optional[str] = None,
+    subject_category: Optional[str] = None,
+    coverage: Optional[str] = None,
+    format: Optional[str] = None,
+    language: Optional[str] = None,
+    copyrights: Optional[str] = None,
+    filename: Optional[str] = None,
+    year_from: Optional[int] = Query(None, description="Year of release, inclusive"),
+    year_to: Optional[int] = Query(None, description="Year of release, inclusive"),
+    modified_after: Optional[datetime.date] = Query(None, description="Object last modified on or after"),
+    modified_before: Optional[datetime.date] = Query(None, description="Object last modified on or before"),
+) -> dict:
+    """Query parameters of /search/ and /facets/ (used with Depends)."""
+    return dict(locals())
+
+
+def filter_params(
+    status: str = Query(None),
+    publisher: str = Query(None),
+    year_of_publish: str = Query(None),
+    document_type: str = Query(None),
+    enforcement: str = Query(None),
+    creator: str = Query(None),
+    contributor: str = Query(None),
+    target_audience: str = Query(None),
+    format: str = Query(None),
+    language: str = Query(None),
+    coverage: str = Query(None),
+    identifier: str = Query(None),
+    month: str = Query(None),
+    document_version: str = Query(None),
+    title: str = Query(None),
+    title_alternative: str = Query(None),
+    owner: str = Query(None),
+    subject: str = Query(None),
+    subject_category: str = Query(None),
+    filename: str = Query(None),
+    copyrights: str = Query(None),
+    brief_description: str = Query(None),
+    date: str = Query(None),
+) -> dict:
+    """Query parameters of /filter-documents/ (used with Depends)."""
+    return dict(locals())
+
+
+def title_filter_params(
+    title: str = Query(None),
+    title_alternative: str = Query(None),
+    owner: str = Query(None),
+    subject: str = Query(None),
+    subject_category: str = Query(None),
+    filename: str = Query(None),
+    copyrights: str = Query(None),
+    brief_description: str = Query(None),
+) -> dict:
+    """Query parameters of /filter-document-title/ (used with Depends)."""
+    return dict(locals())
@@ -0,0 +1,109 @@
+# search_cache.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+# A write is searchable only after the next refresh (1s by default), so results
+# read this soon after a generation bump are served but not cached.
+SEARCH_CACHE_SETTLE_SECONDS = float(os.getenv("SEARCH_CACHE_SETTLE_SECONDS", "2"))
+INDEX_GENERATION_FILE = os.getenv("INDEX_GENERATION_FILE", "/tmp/gogea-index-generation")
+
+
+def bump_index_generation():
+    """
+    Mark the documents index as changed. The generation is the mtime of
+    INDEX_GENERATION_FILE, so every uvicorn worker on the host sees the bump.
+    """
+    with open(INDEX_GENERATION_FILE, "a"):
+        pass
+    now = time.time_ns()
+    os.utime(INDEX_GENERATION_FILE, ns=(now, now))
+
+
+def index_generation() -> int:
+    try:
+        return os.stat(INDEX_GENERATION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+class SearchCache:
+    """
+    In-process LRU + TTL cache of Elasticsearch search responses, keyed by the
+    normalized request (index + body). Entries from an older index generation
+    are never returned, so a write or alias swap invalidates everything at once.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (generation, expires_at, response, cost)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(request: dict) -> str:
+        return json.dumps(request, sort_keys=True, default=str)
+
+    def get(self, key: str, generation: int):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == generation and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[3]
+                return entry[2]
+            if entry:
+                del self._entries[key]  # Stale or expired
+            self.misses += 1
+            return None
+
+    def put(self, key: str, generation: int, response, cost: float):
+        if time.time_ns() - generation < SEARCH_CACHE_SETTLE_SECONDS * 1e9:
+            return
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl, response, cost)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def search_async(self, es, **request):
+        """await es.search(**request), answered from the cache when possible."""
+        key, generation = self.key(request), index_generation()
+        response = self.get(key, generation)
+        if response is None:
+            start = time.perf_counter()
+            response = (await es.search(**request)).body
+            self.put(key, generation, response, time.perf_counter() - start)
+        return response
+
+    def search(self, es, **request):
+        """es.search(**request), answered from the cache when possible."""
+        key, generation = self.key(request), index_generation()
+        response = self.get(key, generation)
+        if response is None:
+            start = time.perf_counter()
+            response = es.search(**request).body
+            self.put(key, generation, response, time.perf_counter() - start)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "generation": index_generation(),
+                "pid": os.getpid(),
+            }
@@ -24,6 +24,8 @@ import filtersData from '../jsons/filters.json';
 
 const windowWidth = Dimensions.get('window').width;
 const dialogSize = windowWidth * 0.36;
+// Filenames per /files/metadata request (the backend's FILE_METADATA_MAX_BATCH)
+const METADATA_BATCH_SIZE = 500;
 
 // Use the imported JSON data:
 const tags = tagsData;
@@ -37,6 +39,8 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState('');
   const [filterValues, setFilterValues] = useState({});
+  // Filter menu values; the static list is shown until /facets/ answers
+  const [filterOptions, setFilterOptions] = useState(filterOptionsWithValues);
   const [currentPage, setCurrentPage] = useState(1);
   
   // openDetailId tracks the file id whose detail section is open.
@@ -59,8 +63,57 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
     }
   };
 
+  // Fetch description and metadata for many files, METADATA_BATCH_SIZE per request
+  const fetchMetadataBatch = async (filenames) => {
+    const chunks = [];
+    for (let i = 0; i < filenames.length; i += METADATA_BATCH_SIZE) {
+      chunks.push(filenames.slice(i, i + METADATA_BATCH_SIZE));
+    }
+    const results = await Promise.all(chunks.map(async (chunk) => {
+      try {
+        const response = await fetch(`${API_BASE_URL}/files/metadata`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ filenames: chunk }),
+        });
+        const result = await response.json();
+        if (result.error) {
+          console.error("Failed to fetch metadata:", result.error);
+        }
+        return result.documents || {};
+      } catch (err) {
+        console.error("Failed to fetch metadata:", err);
+        return {};
+      }
+    }));
+    return Object.assign({}, ...results);
+  };
+
+  // Load the filter menu (values that have documents for the current filters)
+  const fetchFacets = async (activeFilters) => {
+    const queryParams = Object.entries(activeFilters)
+      .flatMap(([key, values]) =>
+        values.map(val => `${filterMapping[key]}=${encodeURIComponent(val)}`)
+      )
+      .join('&');
+    try {
+      const response = await fetch(`${API_BASE_URL}/facets/?${queryParams}`);
+      const result = await response.json();
+      if (result.facets) {
+        setFilterOptions(Object.fromEntries(
+          Object.entries(result.facets)
+            .filter(([_, buckets]) => buckets.length)
+            .map(([name, buckets]) => [name, buckets.map(bucket => bucket.value)])
+        ));
+      }
+    } catch (err) {
+      console.error("Failed to fetch facets:", err);
+    }
+  };
+
   useEffect(() => {
     fetchDefaultFiles();
+    fetchFacets({});
   }, []);
 
   const fetchDefaultFiles = async () => {
@@ -68,21 +121,21 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
     try {
       const response = await fetch(`${API_BASE_URL}/list-files`);
       const fileNames = await response.json();
-      const processed = await Promise.all(
-        fileNames.map(async (filename, i) => {
-          const type = filename.split('.').pop().toUpperCase();
-          const description = await fetchDescription(filename);
-          return {
-            id: i.toString(),
-            fileName: filename,
-            title: filename.replace(/\.[^/.]+$/, ''),
-            category: type,
-            description: description,
-            categoryType: 'digitalGrenada',
-            date: new Date().toLocaleDateString(),
-          };
-        })
-      );
+      const metadataByName = await fetchMetadataBatch(fileNames);
+      const processed = fileNames.map((filename, i) => {
+        const type = filename.split('.').pop().toUpperCase();
+        const { "Brief Description": description, ...metadata } = metadataByName[filename] || {};
+        return {
+          id: i.toString(),
+          fileName: filename,
+          title: filename.replace(/\.[^/.]+$/, ''),
+          category: type,
+          description: description || "No description available",
+          metadata: metadataByName[filename] ? metadata : null,
+          categoryType: 'digitalGrenada',
+          date: new Date().toLocaleDateString(),
+        };
+      });
       setFiles(processed);
     } catch (err) {
       console.error(err);
@@ -241,22 +294,22 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
       const res = await fetch(url);
       const result = await res.json();
       if (result.filenames) {
-        // actually fetch each file's description
-        const docs = await Promise.all(
-          result.filenames.map(async (filename, i) => {
-            const type = filename.split('.').pop().toUpperCase();
-            const desc = await fetchDescription(filename);
-            return {
-              id: i.toString(),
-              fileName: filename,
-              title: filename.replace(/\.[^/.]+$/, ''),
-              category: type,
-              description: desc,
-              categoryType: 'digitalGrenada',
-              date: new Date().toLocaleDateString(),
-            };
-          })
-        );
+        // Descriptions and metadata of every match in one request
+        const metadataByName = await fetchMetadataBatch(result.filenames);
+        const docs = result.filenames.map((filename, i) => {
+          const type = filename.split('.').pop().toUpperCase();
+          const { "Brief Description": description, ...metadata } = metadataByName[filename] || {};
+          return {
+            id: i.toString(),
+            fileName: filename,
+            title: filename.replace(/\.[^/.]+$/, ''),
+            category: type,
+            description: description || "No description available",
+            metadata: metadataByName[filename] ? metadata : null,
+            categoryType: 'digitalGrenada',
+            date: new Date().toLocaleDateString(),
+          };
+        });
         setFiles(docs);
         setCurrentPage(1);
       } else {
@@ -280,6 +333,7 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
     const cleaned = Object.fromEntries(Object.entries(updated).filter(([_, v]) => v.length));
     setFilterValues(cleaned);
     applyFilters(cleaned);
+    fetchFacets(cleaned);
   };
 
   const handleDownload = (file) => {
@@ -298,6 +352,11 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
       return;
     }
     setOpenDetailId(file.id);
+    if (file.metadata) {
+      // Already fetched with the page
+      setSelectedFileDescription(file.metadata);
+      return;
+    }
     setDescLoading(true);
     try {
       const response = await fetch(`${API_BASE_URL}/file-metadata/?filename=${encodeURIComponent(file.fileName)}`);
@@ -430,7 +489,7 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
                         {/* For PDF files, show the preview image on the left */}
                         {file.fileName.toLowerCase().endsWith('.pdf') && (
                           <Image
-                            source={{ uri: `${API_BASE_URL}/preview-file/${encodeURIComponent(file.fileName)}` }}
+                            source={{ uri: `${API_BASE_URL}/preview-file/${encodeURIComponent(file.fileName)}?size=card&format=webp` }}
                             style={styles.previewImage}
                           />
                         )}
@@ -476,7 +535,7 @@ const RepositoryContent = ({ selectedCategory, onCategoryPress }) => {
         {/* Right Column: Filters */}
         <View style={{ flex: 1, backgroundColor: '#fafafa', padding: 8, borderLeftWidth: 1, borderLeftColor: '#eee' }}>
           <ScrollView showsVerticalScrollIndicator={false}>
-            {Object.entries(filterOptionsWithValues).map(([filterName, values]) => (
+            {Object.entries(filterOptions).map(([filterName, values]) => (
               <View key={filterName} style={{ marginBottom: 12 }}>
                 <Text style={{ fontWeight: 'bold', fontSize: 13, marginBottom: 4 }}>{filterName}</Text>
                 <View style={{ flexDirection: 'row', flexWrap: 'wrap', gap: 6 }}>